@@ -5,36 +5,39 @@ df = pd.read_csv('transformed_match_data.csv')
 cricket_data = pd.read_csv('IPl Ball-by-Ball 2008-2023.csv')
 
 # Define functions to calculate performance against a specific team and player
-def performance_against_team(player_name, team_name, df):
-    player_team_data = df[(df['player'] == player_name) & (df['against_team'] == team_name)]
-    matches_played = player_team_data['match_id'].nunique()
-
-    total_runs = player_team_data['run_scored'].sum()
-    total_wickets = player_team_data['wicket'].sum()
-    total_4s = player_team_data['4s'].sum()
-    total_6s = player_team_data['6s'].sum()
-    total_50s = player_team_data['50s'].sum()
-    total_100s = player_team_data['100s'].sum()
-    
-    return {
-        'matches_played': matches_played,
-        'total_runs': total_runs,
-        'total_wickets': total_wickets,
-        'total_4s': total_4s,
-        'total_6s': total_6s,
-        'total_50s': total_50s,
-        'total_100s': total_100s
+# Aggregate every (player, against_team) pair once instead of filtering the whole frame per player
+def build_team_index(df):
+    return df.groupby(['player', 'against_team']).agg(
+        matches_played=('match_id', 'nunique'),
+        total_runs=('run_scored', 'sum'),
+        total_wickets=('wicket', 'sum'),
+        total_4s=('4s', 'sum'),
+        total_6s=('6s', 'sum'),
+        total_50s=('50s', 'sum'),
+        total_100s=('100s', 'sum'),
+    ).to_dict('index')
+
+def performance_against_team(player_name, team_name, team_index):
+    empty = {
+        'matches_played': 0,
+        'total_runs': 0,
+        'total_wickets': 0,
+        'total_4s': 0,
+        'total_6s': 0,
+        'total_50s': 0,
+        'total_100s': 0
     }
+    return team_index.get((player_name, team_name), empty)
 
-def performance_against_player(batsman, bowler, cricket_data):
-    filtered_data = cricket_data[(cricket_data['batsman'] == batsman) & (cricket_data['bowler'] == bowler)]
-    total_runs = filtered_data['batsman_runs'].sum()
-    total_wickets = filtered_data[filtered_data['is_wicket'] == 1].shape[0]
-    
-    return {
-        'total_runs': total_runs,
-        'total_wickets': total_wickets
-    }
+# Batsman-vs-bowler totals aggregated once instead of filtering the ball-by-ball frame per pair
+def build_matchup_index(cricket_data):
+    return cricket_data.groupby(['batsman', 'bowler']).agg(
+        total_runs=('batsman_runs', 'sum'),
+        total_wickets=('is_wicket', 'sum'),
+    ).to_dict('index')
+
+def performance_against_player(batsman, bowler, matchup_index):
+    return matchup_index.get((batsman, bowler), {'total_runs': 0, 'total_wickets': 0})
 
 def calculate_fantasy_points(player_performance, Batsman_points, Bowling_points, Fielding_points):
     fantasy_points = (
@@ -78,16 +81,16 @@ Fielding_points = {
 }
 
 # Aggregate performance metrics for each player in one team against the other team
-def aggregate_performance_metrics(team, opponent_team, team_name, opponent_team_name, df, cricket_data):
+def aggregate_performance_metrics(team, opponent_team, team_name, opponent_team_name, team_index, matchup_index):
     player_performances = []
 
     for player in team:
-        team_performance = performance_against_team(player, opponent_team_name, df)
+        team_performance = performance_against_team(player, opponent_team_name, team_index)
         
         # Performance against each player in the opponent team
         total_opponent_performance = {'total_runs': 0, 'total_wickets': 0}
         for opponent in opponent_team:
-            player_vs_opponent = performance_against_player(player, opponent, cricket_data)
+            player_vs_opponent = performance_against_player(player, opponent, matchup_index)
             total_opponent_performance['total_runs'] += player_vs_opponent['total_runs']
             total_opponent_performance['total_wickets'] += player_vs_opponent['total_wickets']
 
@@ -112,11 +115,14 @@ csk_name = 'Chennai Super Kings'
 gt = ['Rashid Khan', 'Shubman Gill', 'Mohammed Shami', 'WP Saha', 'DA Miller', 'V Shankar', 'MS Wade', 'J Yadav', 'KS Williamson', 'R Sai Kishore', 'MM Sharma']
 gt_name = 'Gujarat Titans'
 
+team_index = build_team_index(df)
+matchup_index = build_matchup_index(cricket_data)
+
 # Aggregate performance metrics for CSK players against GT players
-csk_performances = aggregate_performance_metrics(csk, gt, csk_name, gt_name, df, cricket_data)
+csk_performances = aggregate_performance_metrics(csk, gt, csk_name, gt_name, team_index, matchup_index)
 
 # Aggregate performance metrics for GT players against CSK players
-gt_performances = aggregate_performance_metrics(gt, csk, gt_name, csk_name, df, cricket_data)
+gt_performances = aggregate_performance_metrics(gt, csk, gt_name, csk_name, team_index, matchup_index)
 
 # Combine and sort performances
 combined_performances = csk_performances + gt_performances
@@ -3,6 +3,9 @@ import matplotlib.pyplot as plt
 #import seborn as sns
 import pandas as pd
 import numpy as np
+# Recent form comes from the cricket_fantasy files library, which has to be on PYTHONPATH
+from form import form_table
+from ingest import load_derived
 
 app = Flask(__name__)
 
@@ -13,7 +16,11 @@ Team2_Squad = {}
 
 # Importing basic libraries
 # Reading files
-byb=pd.read_csv('IPl Ball-by-Ball 2008-2023.csv')
+# Only the columns get_players uses, with names as categoricals and narrow integer counts
+byb=pd.read_csv('IPl Ball-by-Ball 2008-2023.csv',
+                usecols=['id','batsman','bowler','batsman_runs','is_wicket','dismissal_kind','fielder'],
+                dtype={'batsman':'category','bowler':'category','fielder':'category','dismissal_kind':'category',
+                       'batsman_runs':'int16','is_wicket':'int8'})
 match= pd.read_csv('IPL Mathces 2008-2023.csv')
 byb.head()
 
@@ -38,44 +45,6 @@ Fielding_points = {'Catch':8, '3Cath':4, 'Stumping':12, 'RunOutD':12,
 csk = ['MS Dhoni', 'Shaik Rasheed', 'Shivam Dube','RD Gaikwad', 'DL Chahar' ,'RA Jadeja','AM Rahane','M Theekshana','TU Deshpande','Simarjeet Singh','MM Ali']
 gt =  ['Rashid Khan', 'Shubman Gill', 'Mohammed Shami', 'WP Saha', 'DA Miller', 'V Shankar','MS Wade','J Yadav','KS Williamson','R Sai Kishore','MM Sharma']
 
-csk_fp = {
-    "RD Gaikwad": 0,
-    "MS Dhoni": 0,
-    "AM Rahane": 0,
-    "Shivam Dube": 0,
-    "RA Jadeja": 0,
-    "Simarjeet Singh": 0,
-    "DL Chahar": 0,
-    "M Theekshana": 0,
-    "TU Deshpande": 0,
-    "Shaik Rasheed": 0,
-    "MM Ali": 0,
-    "Nishant Sindhu": 0,
-    "MJ Santner": 0,
-    "Ajay Mandal": 0,
-    "PH Solanki": 0,
-    "Mukesh Choudhary": 0,
-    "RS Hangargekar": 0,
-}
-
-gt_fp = {
-    "Shubman Gill": 0,
-    "MS Wade": 0,
-    "WP Saha": 0,
-    "KS Williamson": 0,
-    "DA Miller": 0,
-    "DG Nalkande": 0,
-    "V Shankar": 0,
-    "J Yadav": 0,
-    "Mohammed Shami": 0,
-    "Noor Ahmad": 0,
-    "R Sai Kishore": 0,
-    "Rashid Khan": 0,
-    "J Little": 0,
-    "MM Sharma": 0,
-}
-
-
 # ruturaj, A rahane , 
 csk = [
     "RD Gaikwad",
@@ -110,62 +79,64 @@ gt = [
 
 
 
-def get_players(team1,team2,team1_fp):
+# Batsman-vs-bowler totals built with one groupby, so every pair below is a lookup instead of a full scan
+matchups = byb.assign(four=byb['batsman_runs']==4, six=byb['batsman_runs']==6).groupby(['batsman','bowler'],observed=True).agg(
+    balls=('batsman_runs','size'), runs=('batsman_runs','sum'), fours=('four','sum'), sixes=('six','sum'), wickets=('is_wicket','sum'))
+
+# Per-innings runs and wickets built with one groupby each, so the milestone counts in get_players are lookups
+innings_runs = byb.groupby(['id','batsman'],observed=True)['batsman_runs'].sum()
+innings_wickets = byb.groupby(['id','bowler'],observed=True)['is_wicket'].sum()
+# Wickets only count in matches the player also batted in, as the old match-by-match loop did
+innings_wickets = innings_wickets[innings_wickets.index.isin(innings_runs.index)]
+run_milestones = pd.DataFrame({'matches':1, 'r30':(innings_runs>=30)&(innings_runs<50), 'r50':(innings_runs>=50)&(innings_runs<100),
+                               'r100':innings_runs>=100}).groupby(level=1,observed=True).sum()
+wicket_milestones = pd.DataFrame({'w3':innings_wickets==3, 'w4':innings_wickets==4, 'w5':innings_wickets>=5}).groupby(level=1,observed=True).sum()
+catch_counts = byb.loc[byb['dismissal_kind']=='caught','fielder'].value_counts()
+run_out_counts = byb.loc[byb['dismissal_kind']=='run out','fielder'].value_counts()
+lbw_counts = byb.loc[byb['dismissal_kind']=='lbw','bowler'].value_counts()
+bowled_counts = byb.loc[byb['dismissal_kind']=='bowled','bowler'].value_counts()
+
+# Recent form instead of hand-entered points, read from the form tables that ingest keeps up to date,
+# so the history is not rescanned here: each player's mean fantasy points over their last few innings
+def recent_form():
+    return form_table(load_derived()['form'])['last_n_points']
+
+def get_players(team1,team2,team1_fp=None):
+    if team1_fp is None:
+        team1_fp = recent_form()
     fantasy_team_players = []
+    # Gather every team1 x team2 pairing in both directions at once
+    bat_block = matchups.reindex(pd.MultiIndex.from_product([team1,team2]), fill_value=0)
+    bowl_block = matchups.reindex(pd.MultiIndex.from_product([team1,team2]).swaplevel(), fill_value=0)
 
     for i in range(len(team1)):
-        unq_ids = byb[byb["batsman"]==team1[i]]['id'].unique()
-        mathces_played = len(unq_ids)
-        print ( "Number of matches played" , len(unq_ids),team1[i])
-        bbr = []
-        for x in unq_ids:
-            bat_run = sum(byb[(byb["batsman"]==team1[i])&(byb['id']==x)]['batsman_runs'])
-            bbr.append(bat_run)
-
-        r30,r50,r100 =0,0,0
-        for m in bbr:
-            if m>=100:
-                r100+=1
-            elif m>=50:
-                r50+=1
-            elif m>=30:
-                r30+=1
+        mathces_played = int(run_milestones['matches'].get(team1[i], 0))
+        print ( "Number of matches played" , mathces_played,team1[i])
+        r30,r50,r100 = (int(run_milestones[c].get(team1[i], 0)) for c in ['r30','r50','r100'])
         try:
-            catches = len(byb[(byb['fielder']==team1[i]) & (byb['dismissal_kind']=='caught')])/mathces_played
-            run_outs = len(byb[(byb['fielder']==team1[i]) & (byb['dismissal_kind']=='run out')])/mathces_played
+            catches = int(catch_counts.get(team1[i], 0))/mathces_played
+            run_outs = int(run_out_counts.get(team1[i], 0))/mathces_played
             extra_points = r30/mathces_played*Batsman_points['30Runs'] +r50/mathces_played*Batsman_points['Half_century'] +r100/mathces_played*Batsman_points['Century'] +catches*Fielding_points['Catch']+run_outs*Fielding_points['RunOutInd']
         except:
             catches, run_outs, extra_points = 0,0,0
         
         # Extra Points for bowlers to be estimated here
-        wickets_taken = []
-        for x in unq_ids:
-            twx = sum(byb[(byb["bowler"]==team1[i]) & (byb['id']==x)]['is_wicket'])
-            wickets_taken.append(twx)
-
-        w3,w4,w5 = 0,0,0
-        for z in wickets_taken:
-            if z>=5:
-                w5+=1
-            elif z>=4:
-                w4+=1
-            elif z>=3:
-                w3+=1
+        w3,w4,w5 = (int(wicket_milestones[c].get(team1[i], 0)) for c in ['w3','w4','w5'])
         try:
-            lbws = len((byb[(byb['bowler']==team1[i]) & (byb['dismissal_kind']=='lbw')]))/mathces_played      
-            bowled = len((byb[(byb['bowler']==team1[i]) & (byb['dismissal_kind']=='bowled')]))/mathces_played      
+            lbws = int(lbw_counts.get(team1[i], 0))/mathces_played
+            bowled = int(bowled_counts.get(team1[i], 0))/mathces_played
             wexp = w3/mathces_played*Bowling_points['3W'] + w4/mathces_played*Bowling_points['4W'] + w5/mathces_played*Bowling_points['5W'] + lbws*Bowling_points['LBW_Bowled'] + bowled*Bowling_points['LBW_Bowled']
         except:
             lbws, bowled, wexp = 0,0,0
         
         ffp = []
         for j in range(len(team2)):
-            bat_vs_bowl = byb[(byb["batsman"]==team1[i]) & (byb["bowler"]==team2[j])]
-            bowls_played = len(bat_vs_bowl.batsman_runs)
-            runs_scored = sum(bat_vs_bowl.batsman_runs)
-            fours = len(bat_vs_bowl[bat_vs_bowl['batsman_runs']==4])
-            sixes = len(bat_vs_bowl[bat_vs_bowl['batsman_runs']==6])
-            wicket = sum(bat_vs_bowl.is_wicket)
+            bat_vs_bowl = bat_block.iloc[i*len(team2)+j]
+            bowls_played = int(bat_vs_bowl.balls)
+            runs_scored = int(bat_vs_bowl.runs)
+            fours = int(bat_vs_bowl.fours)
+            sixes = int(bat_vs_bowl.sixes)
+            wicket = int(bat_vs_bowl.wickets)
             if bowls_played <=6*10 and wicket >=5:
                 penalty = -16
                 print (team1[i], "ka wicket taken",wicket,"times by", team2[j])
@@ -188,22 +159,22 @@ def get_players(team1,team2,team1_fp):
                 elif strike_rate >=150:
                     print (team1[i] ,"beaten", team2[j], "Runs", runs_scored,"bowls",bowls_played,"strike rate", strike_rate,'Out',wicket,'times', "Fours", fours,"Sixes", sixes)            
    
-            bowl_vs_bat = byb[(byb["bowler"]==team1[i]) & (byb["batsman"]==team2[j])]
-            wicket_took = sum(bowl_vs_bat.is_wicket)
+            wicket_took = int(bowl_block.iloc[i*len(team2)+j].wickets)
             fantasy_points1 = runs_scored + fours*Batsman_points['bFour'] + sixes*Batsman_points['bSix'] - wicket*Bowling_points['Wicket'] + wicket_took*Bowling_points['Wicket'] + penalty 
             ffp.append(fantasy_points1)
             print (team1[i] ,"against", team2[j], "Runs", runs_scored, 
                      "bowls",bowls_played,"strike rate", strike_rate,
                      'Out',wicket,'times', "Fours", fours,"Sixes", sixes, "fatansy points",fantasy_points1)
         sum_ffp = sum(ffp)
-        if team1_fp[team1[i]] > 0:
-            recent_performace_points = np.log(team1_fp[team1[i]])
-        elif team1_fp[team1[i]] <0:
-            recent_performace_points = -np.log(abs(team1_fp[team1[i]]))
+        recent_fp = float(team1_fp.get(team1[i], 0))
+        if recent_fp > 0:
+            recent_performace_points = np.log(recent_fp)
+        elif recent_fp <0:
+            recent_performace_points = -np.log(abs(recent_fp))
         else:
             recent_performace_points = 0
         # Trying a new method for recent performancec point
-        recent_performace_points = team1_fp[team1[i]]/3
+        recent_performace_points = recent_fp
         weight1 = 0.5
         weight2 = 1 - weight1
         final_fantasy_point = (sum_ffp + extra_points + wexp)*weight1 + recent_performace_points*weight2
@@ -213,10 +184,10 @@ def get_players(team1,team2,team1_fp):
         print ("Fatasy points of",team1[i],final_fantasy_point)
     return fantasy_team_players
 
-get_players(gt,csk,gt_fp)
+get_players(gt,csk)
 
-t1 = get_players(gt,csk,gt_fp)
-t2 = get_players(csk,gt,csk_fp)
+t1 = get_players(gt,csk)
+t2 = get_players(csk,gt)
 
 # [(92.08, 'RD Gaikwad'), (69.23, 'MM Ali'), (44.61, 'RA Jadeja'), (33.57, 'MS Dhoni'), (17.5, 'DL Chahar'), (1.33, 'TU Deshpande'), (0.0, 'Simarjeet Singh'), (0.0, 'Shivam Dube'), (0.0, 'Shaik Rasheed'), (0.0, 'M Theekshana'), (-3.3, 'AM Rahane')]
 # [(113.84, 'Shubman Gill'), (108.83, 'Mohammed Shami'), (90.09, 'WP Saha'), (74.7, 'Rashid Khan'), (49.64, 'DA Miller'), (34.43, 'KS Williamson'), (26.77, 'V Shankar'), (16.5, 'J Yadav'), (1.81, 'MS Wade'), (0.0, 'Noor Ahmad'), (0.0, 'DG Nalkande')]
@@ -0,0 +1,163 @@
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from cricket_predictions import MODEL_BACKEND, TRAINING_PARAMS, load_or_train_models, score_fixtures
+from data_cache import read_cached
+from lineup import LINEUP_RULES, infer_roles, optimal_lineups
+from model_store import MODEL_STORE_DIR
+from performance_index import build_performance_index, merge_performance_index
+from scoring import score_table
+
+MATCHES_FILE = 'IPL Mathces 2008-2023.csv'
+TRANSFORMED_FILE = 'transformed_match_data.csv'
+AVERAGE_COLUMNS = ['ball_faced', 'ball_delivered', 'run_given']
+
+# Every match with its date and season (the year it was played in), in date order
+def load_schedule(matches_file=MATCHES_FILE):
+    matches = read_cached(matches_file, ['id', 'date', 'team1', 'team2'])
+    schedule = pd.DataFrame({
+        'match_id': matches['id'].astype(int).to_numpy(),
+        'date': pd.to_datetime(matches['date'].astype(str)).to_numpy(),
+        'team1': matches['team1'].astype(str).to_numpy(),
+        'team2': matches['team2'].astype(str).to_numpy(),
+    })
+    schedule['season'] = schedule['date'].dt.year
+    return schedule.sort_values(['date', 'match_id'], kind='stable').reset_index(drop=True)
+
+# Per-innings history with each match's date and the fantasy points the player actually scored,
+# computed once and shared by every fold
+def load_history(transformed_file, schedule):
+    innings = read_cached(transformed_file)
+    innings = innings.astype({'player': str, 'against_team': str})
+    history = innings.merge(schedule[['match_id', 'date', 'season']], on='match_id', how='inner')
+    history['actual_points'] = score_table(history, 't20').to_numpy()
+    return history
+
+# Best XI of a pool under the lineup rules, or its top scorers if no legal XI can be formed from it
+def pick_xi(pool, rules=LINEUP_RULES):
+    lineups = optimal_lineups(pool, 1, rules)
+    if lineups:
+        return lineups[0]
+    players = pool.sort_values('score', ascending=False, kind='stable')['player'].head(rules['size']).tolist()
+    return {'players': players, 'captain': players[0] if players else None, 'vice_captain': players[1] if len(players) > 1 else None}
+
+# Points a lineup actually earned, with the captain and vice-captain multipliers
+def lineup_points(lineup, actual, rules=LINEUP_RULES):
+    points = 0.0
+    for player in lineup['players']:
+        multiplier = rules['captain'] if player == lineup['captain'] else rules['vice_captain'] if player == lineup['vice_captain'] else 1.0
+        points += multiplier * actual.get(player, 0.0)
+    return points
+
+# Score one fixture from the tables as they stood before it and compare the picked XI with the best XI in hindsight
+def evaluate_fixture(fixture, played, history, artifacts, performance_index, averages):
+    squad_a = played.loc[played['against_team'] == fixture.team2, 'player'].unique().tolist()
+    squad_b = played.loc[played['against_team'] == fixture.team1, 'player'].unique().tolist()
+    results = score_fixtures([(fixture.match_id, fixture.team1, squad_a, fixture.team2, squad_b)], history, artifacts,
+                             performance_index, averages)
+    actual = played.groupby('player')['actual_points'].sum()
+    roles = infer_roles(history, squad_a + squad_b)
+    pool = results.assign(role=results['player'].map(roles), score=results['combined_score'], actual_points=results['player'].map(actual))
+
+    picked = pick_xi(pool)
+    best = pick_xi(pool.assign(score=pool['actual_points']))
+    picked_points = lineup_points(picked, actual)
+    best_points = lineup_points(best, actual)
+    return {
+        'season': fixture.season,
+        'match_id': fixture.match_id,
+        'date': fixture.date,
+        'team1': fixture.team1,
+        'team2': fixture.team2,
+        'players': len(pool),
+        'picked_points': picked_points,
+        'best_points': best_points,
+        'capture': picked_points / best_points if best_points > 0 else np.nan,
+        'overlap': len(set(picked['players']) & set(best['players'])),
+        'rank_correlation': pool['combined_score'].corr(pool['actual_points'], method='spearman'),
+    }
+
+# Replay one season in date order. Models are trained on everything before the season starts, while the
+# performance index and per-player averages grow one match day at a time, so every fixture is scored
+# from data strictly before its date. Parameters default to TRAINING_PARAMS rather than the store's tuned
+# ones, which were chosen on the full history and would leak later seasons into every fold.
+def backtest_season(transformed_file, history, fixtures, params=TRAINING_PARAMS, store_dir=MODEL_STORE_DIR,
+                    backend=MODEL_BACKEND, n_jobs=1):
+    start = fixtures['date'].min()
+    before = history[history['date'] < start]
+    if before.empty:
+        return []
+    artifacts = load_or_train_models(transformed_file, before, params, store_dir, n_jobs, backend=backend,
+                                     scope={'trained_before': start.strftime('%Y-%m-%d')})
+    performance_index = build_performance_index(before)
+    sums = before.groupby('player')[AVERAGE_COLUMNS].sum()
+    counts = before.groupby('player').size()
+
+    season = history[history['match_id'].isin(fixtures['match_id'])]
+    rows = []
+    for _, day in fixtures.groupby('date', sort=True):
+        averages = sums.div(counts, axis=0)
+        for fixture in day.itertuples(index=False):
+            played = season[season['match_id'] == fixture.match_id]
+            if not played.empty:
+                rows.append(evaluate_fixture(fixture, played, before, artifacts, performance_index, averages))
+        day_innings = season[season['match_id'].isin(day['match_id'])]
+        performance_index = merge_performance_index(performance_index, build_performance_index(day_innings))
+        sums = sums.add(day_innings.groupby('player')[AVERAGE_COLUMNS].sum(), fill_value=0)
+        counts = counts.add(day_innings.groupby('player').size(), fill_value=0)
+    return rows
+
+# Walk forward through the seasons, one fold per season in a process pool; each fold only gets the
+# history up to its own season's end. Trained fold models are kept in the model store, so reruns
+# only pay for the replay.
+def run_backtest(transformed_file=TRANSFORMED_FILE, matches_file=MATCHES_FILE, seasons=None, params=TRAINING_PARAMS,
+                 store_dir=MODEL_STORE_DIR, backend=MODEL_BACKEND, n_jobs=-1):
+    schedule = load_schedule(matches_file)
+    history = load_history(transformed_file, schedule)
+    schedule = schedule[schedule['match_id'].isin(history['match_id'])]
+    if seasons is None:
+        # The first season has nothing before it to train on
+        seasons = sorted(schedule['season'].unique())[1:]
+
+    folds = []
+    for season in seasons:
+        fixtures = schedule[schedule['season'] == season]
+        if len(fixtures):
+            folds.append((history[history['date'] <= fixtures['date'].max()], fixtures))
+    fold_rows = Parallel(n_jobs=n_jobs)(
+        delayed(backtest_season)(transformed_file, fold_history, fixtures, params, store_dir, backend)
+        for fold_history, fixtures in folds
+    )
+    return pd.DataFrame([row for rows in fold_rows for row in rows])
+
+# Per-season and overall accuracy of the picked XIs
+def summarize_backtest(results):
+    def summary(group):
+        return pd.Series({
+            'fixtures': len(group),
+            'picked_points': group['picked_points'].mean(),
+            'best_points': group['best_points'].mean(),
+            'capture': group['picked_points'].sum() / group['best_points'].sum(),
+            'overlap': group['overlap'].mean(),
+            'rank_correlation': group['rank_correlation'].mean(),
+        })
+    seasons = results.groupby('season')[results.columns].apply(summary)
+    seasons.loc['all'] = summary(results)
+    return seasons
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Walk-forward backtest of the picked XIs, season by season')
+    parser.add_argument('--data', default=TRANSFORMED_FILE)
+    parser.add_argument('--matches', default=MATCHES_FILE)
+    parser.add_argument('--seasons', type=int, nargs='+', help='seasons to replay (default: all but the first)')
+    parser.add_argument('--backend', default=MODEL_BACKEND)
+    parser.add_argument('--n-jobs', type=int, default=-1, help='seasons replayed in parallel')
+    parser.add_argument('--output', default='backtest_results.csv')
+    args = parser.parse_args()
+
+    results = run_backtest(args.data, args.matches, args.seasons, backend=args.backend, n_jobs=args.n_jobs)
+    results.to_csv(args.output, index=False)
+    print(summarize_backtest(results).round(3).to_string())
+    print(f"{len(results)} fixtures backtested, results written to {args.output}")
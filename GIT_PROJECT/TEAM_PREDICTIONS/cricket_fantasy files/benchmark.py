@@ -0,0 +1,221 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import threading
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+import cricket_predictions as cp
+from data_cache import read_cached
+from model_backends import model_size
+from matchup_store import build_matchup_store, head_to_head_points
+from performance_index import build_performance_index, bulk_performance_lookup
+from profiling import current_rss_mb, peak_rss_mb
+from stream_transform import stream_transform
+from synthetic_league import generate_league
+
+BENCH_SCALES = [1, 10, 100]
+FIXTURES_PER_SEASON = 64
+
+# tracemalloc gives per-stage allocation peaks but slows allocation-heavy stages several times over,
+# so it is opt-in (--trace-memory) and timings from such runs should not be compared with normal ones
+TRACE_MEMORY = False
+
+# How often the resident set size is sampled while a stage runs
+RSS_SAMPLE_SECONDS = 0.005
+
+# Highest resident set size seen while a stage runs, sampled from a background thread; unlike the
+# process high-water mark it is not inherited from the largest stage that ran before
+def sample_rss(peak, stop):
+    while True:
+        rss = current_rss_mb()
+        if rss is not None:
+            peak[0] = max(peak[0], rss)
+        if stop.wait(RSS_SAMPLE_SECONDS):
+            return
+
+# Run one stage, recording wall time, CPU time, the stage's own peak and growth of resident memory, and
+# the process-lifetime high-water mark after it (cumulative, so it only says which stage set the record)
+def measure(results, name, func, *args, **kwargs):
+    if TRACE_MEMORY:
+        tracemalloc.start()
+    rss_before = current_rss_mb()
+    peak, stop = [rss_before or 0.0], threading.Event()
+    sampler = threading.Thread(target=sample_rss, args=(peak, stop), daemon=True)
+    sampler.start()
+    start, start_cpu = time.perf_counter(), time.process_time()
+    value = func(*args, **kwargs)
+    elapsed, cpu = time.perf_counter() - start, time.process_time() - start_cpu
+    stop.set()
+    sampler.join()
+    rss_after = current_rss_mb()
+    results[name] = {
+        'seconds': round(elapsed, 4),
+        'cpu_seconds': round(cpu, 4),
+        'stage_peak_rss_mb': None if rss_before is None else round(max(peak[0], rss_after), 2),
+        'rss_growth_mb': None if rss_before is None else round(rss_after - rss_before, 2),
+        'process_peak_rss_mb': peak_rss_mb(),
+    }
+    if TRACE_MEMORY:
+        results[name]['traced_peak_mb'] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 2)
+        tracemalloc.stop()
+    return value
+
+# Current commit of the working tree, so results can be compared across commits
+def current_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# Two random 11-player squads per fixture, each scored against a random opponent
+def sample_pairs(rng, data, n_fixtures):
+    players = data['player'].unique()
+    teams = data['against_team'].unique()
+    return list(zip(rng.choice(players, n_fixtures * 22), rng.choice(teams, n_fixtures * 22)))
+
+# Time every pipeline stage on one generated dataset
+def run_stages(data_dir, seed=42, n_jobs=cp.TRAINING_N_JOBS):
+    transformed_file = os.path.join(data_dir, 'transformed_match_data.csv')
+    byb_file = os.path.join(data_dir, 'IPl Ball-by-Ball 2008-2023.csv')
+    cache_dir = os.path.join(data_dir, '.data_cache')
+    rng = np.random.default_rng(seed)
+    stages = {}
+
+    # Start from an empty cache so the first load pays the CSV conversion and the second shows a warm read
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    measure(stages, 'read_csv', pd.read_csv, transformed_file)
+    measure(stages, 'load_data_cold', cp.load_data, transformed_file, cp.DATA_COLUMNS, cache_dir)
+    data = measure(stages, 'load_data_warm', cp.load_data, transformed_file, cp.DATA_COLUMNS, cache_dir)
+    train_data, encoder, against_team_encoded = measure(stages, 'preprocess_data', cp.preprocess_data, data.copy(), cp.OPPONENT_ENCODING)
+    models_runs, models_wickets, kmeans_runs, kmeans_wickets = measure(
+        stages, 'train_models', cp.train_models, train_data, against_team_encoded, n_jobs=n_jobs, encoder=encoder)
+    features_runs = ['ball_faced'] + cp.encoded_columns(against_team_encoded, encoder)
+    features_wickets = ['ball_delivered', 'run_given'] + cp.encoded_columns(against_team_encoded, encoder)
+    models = (models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets)
+
+    fixture_pairs = sample_pairs(rng, data, 1)
+    season_pairs = sample_pairs(rng, data, FIXTURES_PER_SEASON)
+    measure(stages, 'predict_runs_and_wickets', cp.predict_runs_and_wickets,
+            [player for player, _ in fixture_pairs], fixture_pairs[0][1], *models, encoding=cp.OPPONENT_ENCODING)
+    measure(stages, 'predict_season_batch', cp.predict_runs_and_wickets_batch, season_pairs, *models, encoding=cp.OPPONENT_ENCODING)
+
+    measure(stages, 'performance_against_team', lambda: [cp.performance_against_team(p, t, data) for p, t in fixture_pairs])
+    index = measure(stages, 'build_performance_index', build_performance_index, data)
+    measure(stages, 'performance_lookup_season', bulk_performance_lookup, index, season_pairs)
+
+    measure(stages, 'load_ball_by_ball_cold', read_cached, byb_file, None, cache_dir)
+    byb = measure(stages, 'load_ball_by_ball_warm', read_cached, byb_file, None, cache_dir)
+    store = measure(stages, 'build_matchup_store', build_matchup_store, byb)
+    measure(stages, 'stream_transform', stream_transform, byb_file, os.path.join(data_dir, 'stream_transformed.csv'))
+    squads = rng.choice(np.asarray(store['players']), 22, replace=False)
+    measure(stages, 'head_to_head_points', lambda: (head_to_head_points(store, squads[:11], squads[11:]),
+                                                    head_to_head_points(store, squads[11:], squads[:11])))
+    return stages
+
+# Train every model backend, plus the flattened form of each, on one generated dataset and report its
+# training time, stored size and the latency of a season batch and of a single (player, opponent) pair
+def run_backends(data_dir, backends, seed=42, n_jobs=cp.TRAINING_N_JOBS):
+    transformed_file = os.path.join(data_dir, 'transformed_match_data.csv')
+    store_dir = os.path.join(data_dir, '.backend_models')
+    data = cp.load_data(transformed_file, cp.DATA_COLUMNS, os.path.join(data_dir, '.data_cache'))
+    averages = cp.player_averages(data)
+    rng = np.random.default_rng(seed)
+    season_pairs = sample_pairs(rng, data, FIXTURES_PER_SEASON)
+    shutil.rmtree(store_dir, ignore_errors=True)
+
+    results = {}
+    for backend in backends:
+        for flatten in (False, True):
+            timings = {}
+            artifacts = measure(timings, 'train', cp.load_or_train_models, transformed_file, data, store_dir=store_dir,
+                                n_jobs=n_jobs, backend=backend, flatten=flatten)
+            measure(timings, 'predict_season_batch', cp.predict_pairs, season_pairs, data, artifacts, averages)
+            measure(timings, 'predict_single_pair', cp.predict_pairs, season_pairs[:1], data, artifacts, averages)
+            results[backend + ('_flat' if flatten else '')] = {
+                # The flattened variant is exported from the stored unflattened models, so its train time is the export
+                'train_seconds': timings['train']['seconds'],
+                'model_bytes': model_size(artifacts),
+                'batch_seconds': timings['predict_season_batch']['seconds'],
+                'batch_pairs': len(season_pairs),
+                'single_pair_seconds': timings['predict_single_pair']['seconds'],
+            }
+    return results
+
+# Generate each scale's data once, then time the pipeline on it
+def run_benchmark(scales, work_dir, seed=42, n_jobs=cp.TRAINING_N_JOBS, backends=None):
+    report = {
+        'commit': current_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'trace_memory': TRACE_MEMORY,
+        'runs': [],
+    }
+    for scale in scales:
+        data_dir = os.path.join(work_dir, f'scale_{scale}x')
+        if not os.path.exists(os.path.join(data_dir, 'transformed_match_data.csv')):
+            generate_league(data_dir, scale, seed)
+        sizes = {
+            'player_innings': sum(1 for _ in open(os.path.join(data_dir, 'transformed_match_data.csv'))) - 1,
+            'balls': sum(1 for _ in open(os.path.join(data_dir, 'IPl Ball-by-Ball 2008-2023.csv'))) - 1,
+        }
+        if backends:
+            report['runs'].append({'scale': scale, 'sizes': sizes, 'backends': run_backends(data_dir, backends, seed, n_jobs)})
+        else:
+            report['runs'].append({'scale': scale, 'sizes': sizes, 'stages': run_stages(data_dir, seed, n_jobs)})
+    return report
+
+# Per-stage time ratio (new / old) of two result files at every scale they share
+def compare_reports(old_report, new_report):
+    old_runs = {run['scale']: run for run in old_report['runs']}
+    rows = []
+    for run in new_report['runs']:
+        old = old_runs.get(run['scale'])
+        if old is None or 'stages' not in run or 'stages' not in old:
+            continue
+        for stage, result in run['stages'].items():
+            if stage in old['stages']:
+                before = old['stages'][stage]['seconds']
+                rows.append((run['scale'], stage, before, result['seconds'], result['seconds'] / before if before else float('nan')))
+    return pd.DataFrame(rows, columns=['scale', 'stage', 'old_seconds', 'new_seconds', 'ratio'])
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the prediction pipeline on synthetic leagues')
+    parser.add_argument('--scales', type=float, nargs='+', default=BENCH_SCALES, help='multiples of the real IPL volume')
+    parser.add_argument('--work-dir', default='bench_data', help='where generated datasets are kept between runs')
+    parser.add_argument('--output', default='bench_results', help='directory for the JSON results')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--n-jobs', type=int, default=cp.TRAINING_N_JOBS)
+    parser.add_argument('--trace-memory', action='store_true', help='record per-stage allocation peaks (slows the run)')
+    parser.add_argument('--backends', nargs='+', choices=list(cp.MODEL_BACKENDS),
+                        help='compare model backends (size and inference latency) instead of timing the pipeline')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files instead of running')
+    args = parser.parse_args()
+
+    if args.compare:
+        with open(args.compare[0]) as f_old, open(args.compare[1]) as f_new:
+            print(compare_reports(json.load(f_old), json.load(f_new)).to_string(index=False))
+    else:
+        TRACE_MEMORY = args.trace_memory
+        report = run_benchmark([int(s) if s.is_integer() else s for s in args.scales], args.work_dir, args.seed, args.n_jobs, args.backends)
+        os.makedirs(args.output, exist_ok=True)
+        path = os.path.join(args.output, f"bench_{report['commit'] or 'nogit'}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2)
+        for run in report['runs']:
+            print(f"scale {run['scale']}x: {run['sizes']}")
+            for stage, result in run.get('stages', {}).items():
+                print(f"  {stage:<28}{result['seconds']:>10.3f} s  stage peak RSS {result['stage_peak_rss_mb']} MB  "
+                      f"growth {result['rss_growth_mb']} MB  process peak {result['process_peak_rss_mb']} MB")
+            for backend, result in run.get('backends', {}).items():
+                print(f"  {backend:<22}train {result['train_seconds']:>8.3f} s  size {result['model_bytes'] / 2 ** 20:>8.2f} MB  "
+                      f"batch {result['batch_seconds']:>7.3f} s  single {result['single_pair_seconds'] * 1000:>8.1f} ms")
+        print(f"Results written to {path}")
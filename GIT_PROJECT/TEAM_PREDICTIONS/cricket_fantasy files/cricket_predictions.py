@@ -1,19 +1,65 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestRegressor, RandomForestClassifier
 from sklearn.cluster import KMeans
 from sklearn.metrics import mean_absolute_error, accuracy_score
 from sklearn.preprocessing import OneHotEncoder
 import warnings
+from joblib import Parallel, delayed, effective_n_jobs
+from data_cache import CACHE_DIR, read_cached
+from data_store import DATA_STORE_DIR, active_filters, data_source, read_table
+from lineup import ROLE_COLUMNS, infer_roles, optimal_lineups
+from model_backends import fit_global_forest, fit_hist_gb, flatten_models, predict_global_forest, predict_hist_gb
+from ingest import history_performance_index
+from model_store import MODEL_STORE_DIR, store_key, load_artifacts, load_tuned_params, save_artifacts
+from performance_index import bulk_performance_lookup
+from prediction_cache import PREDICTION_CACHE_DIR, PredictionCache, data_version
+from profiling import count, profiled, stage
+from scoring import score_table
 warnings.filterwarnings("ignore")
 
-# Load the CSV file into a pandas DataFrame
-def load_data(transformed_file):
-    data = pd.read_csv(transformed_file)
+# Parameters that define a trained model set; changing any of them invalidates stored artifacts
+TRAINING_PARAMS = {'n_clusters': 5, 'n_estimators': 100, 'random_state': 42}
+
+# How opponents are fed to the models: 'sparse' keeps the one-hot encoding as a CSR matrix from training
+# through inference, 'dense' expands it into DataFrame columns; both give the same predictions
+OPPONENT_ENCODING = 'sparse'
+ENCODINGS = ['dense', 'sparse']
+
+# Model family used unless a caller picks another one from MODEL_BACKENDS
+MODEL_BACKEND = 'cluster_forest'
+
+# CPU budget for training (joblib convention, -1 = all cores); it does not change the fitted models
+TRAINING_N_JOBS = -1
+
+# Columns of the transformed match data that the prediction pipeline reads
+DATA_COLUMNS = ['match_id', 'player', 'against_team', 'ball_faced', 'run_scored', 'ball_delivered', 'run_given', 'wicket', '4s', '6s']
+
+# Load the CSV file into a pandas DataFrame through the columnar cache. With any filter (league, seasons,
+# teams, players) the innings come from the partitioned data store instead, which reads only the matching
+# partitions and columns, so one league's query never loads another league's data.
+@profiled()
+def load_data(transformed_file, columns=None, cache_dir=CACHE_DIR, store_dir=DATA_STORE_DIR, **filters):
+    if active_filters(filters):
+        return read_table('innings', columns, store_dir, **filters)
+    data = read_cached(transformed_file, columns, cache_dir)
     return data
 
-# Preprocess the data by encoding categorical features and ensuring correct data types
-def preprocess_data(data):
+# Preprocess the data by encoding categorical features and ensuring correct data types; with
+# encoding='sparse' the frame is left untouched and the encoding is returned as a CSR matrix
+@profiled()
+def preprocess_data(data, encoding='dense'):
+    if encoding not in ENCODINGS:
+        raise ValueError(f"Unknown encoding {encoding!r}, expected one of {ENCODINGS}")
+    # Opponents the models never saw (a new franchise) are encoded like the dropped first category instead of failing
+    if encoding == 'sparse':
+        encoder = OneHotEncoder(drop='first', handle_unknown='ignore')
+        against_team_encoded = encoder.fit_transform(data[['against_team']]).tocsr()
+        count('sklearn.fit_transform')
+        return data, encoder, against_team_encoded
+
     data['ball_faced'] = data['ball_faced'].astype(int)
     data['run_scored'] = data['run_scored'].astype(int)
     data['ball_delivered'] = data['ball_delivered'].astype(int)
@@ -21,8 +67,9 @@ def preprocess_data(data):
     data['wicket'] = data['wicket'].astype(int)
 
     # One-hot encode the 'against_team' categorical feature
-    encoder = OneHotEncoder(drop='first')
+    encoder = OneHotEncoder(drop='first', handle_unknown='ignore')
     against_team_encoded = encoder.fit_transform(data[['against_team']])
+    count('sklearn.fit_transform')
     against_team_encoded_df = pd.DataFrame(against_team_encoded.toarray(), columns=encoder.get_feature_names_out(['against_team']))
 
     data.reset_index(drop=True, inplace=True)
@@ -32,95 +79,261 @@ def preprocess_data(data):
     data = pd.concat([data, against_team_encoded_df], axis=1)
     return data, encoder, against_team_encoded_df
 
+# Split a CPU budget between concurrent model fits and the threads each fit may use
+def split_cpu_budget(n_jobs, n_tasks):
+    total = effective_n_jobs(n_jobs)
+    workers = max(1, min(total, n_tasks))
+    threads_per_worker = max(1, total // workers)
+    return workers, threads_per_worker
+
+# Names of the opponent feature columns, whichever form the encoding is in
+def encoded_columns(against_team_encoded, encoder=None):
+    if sparse.issparse(against_team_encoded):
+        return list(encoder.get_feature_names_out(['against_team']))
+    return list(against_team_encoded.columns)
+
+# Feature matrix of some numeric columns followed by the opponent encoding; a DataFrame for the dense
+# encoding, a CSR matrix for the sparse one so the one-hot block is never expanded
+def model_features(data, numeric_columns, against_team_encoded, opponent_columns):
+    if sparse.issparse(against_team_encoded):
+        numeric = sparse.csr_matrix(data[numeric_columns].to_numpy(dtype=float))
+        return sparse.hstack([numeric, against_team_encoded], format='csr')
+    return data[numeric_columns + opponent_columns]
+
+# Fit a single cluster model; module level so it can be shipped to worker processes
+def fit_cluster_model(model, features, target):
+    model.fit(features, target)
+    return model
+
 # Train the models for predicting runs and wickets
-def train_models(data, against_team_encoded_df):
+@profiled()
+def train_models(data, against_team_encoded_df, n_clusters=5, n_estimators=100, random_state=42, n_jobs=TRAINING_N_JOBS, encoder=None,
+                 max_depth=None, min_samples_leaf=1):
     global features_runs, features_wickets
+    opponent_columns = encoded_columns(against_team_encoded_df, encoder)
 
     # Define features and targets for runs prediction
-    features_runs = data[['ball_faced'] + list(against_team_encoded_df.columns)]
-    target_runs = data['run_scored']
+    features_runs = model_features(data, ['ball_faced'], against_team_encoded_df, opponent_columns)
+    target_runs = data['run_scored'].to_numpy(dtype=int)
 
     # Define features and targets for wickets prediction
-    features_wickets = data[['ball_delivered', 'run_given'] + list(against_team_encoded_df.columns)]
-    target_wickets = data['wicket']
+    features_wickets = model_features(data, ['ball_delivered', 'run_given'], against_team_encoded_df, opponent_columns)
+    target_wickets = data['wicket'].to_numpy(dtype=int)
 
-    # Apply KMeans clustering for runs prediction
-    kmeans_runs = KMeans(n_clusters=5, random_state=42)
-    data['cluster_runs'] = kmeans_runs.fit_predict(features_runs)
+    with stage('kmeans_fit', rows_in=len(data)):
+        # Apply KMeans clustering for runs prediction
+        kmeans_runs = KMeans(n_clusters=n_clusters, random_state=random_state)
+        cluster_runs = kmeans_runs.fit_predict(features_runs)
 
-    # Apply KMeans clustering for wickets prediction
-    kmeans_wickets = KMeans(n_clusters=5, random_state=42)
-    data['cluster_wickets'] = kmeans_wickets.fit_predict(features_wickets)
+        # Apply KMeans clustering for wickets prediction
+        kmeans_wickets = KMeans(n_clusters=n_clusters, random_state=random_state)
+        cluster_wickets = kmeans_wickets.fit_predict(features_wickets)
+        count('sklearn.fit', 2)
 
-    # Train RandomForest models for each cluster in runs prediction
-    models_runs = {}
+    # Every cluster model of both families is an independent fit, so they all run concurrently
+    # in a process pool; each forest gets its share of the thread budget so cores aren't oversubscribed
+    workers, threads_per_worker = split_cpu_budget(n_jobs, kmeans_runs.n_clusters + kmeans_wickets.n_clusters)
+    jobs = []
     for cluster_id in range(kmeans_runs.n_clusters):
-        cluster_data = data[data['cluster_runs'] == cluster_id]
-        cluster_features = cluster_data[['ball_faced'] + list(against_team_encoded_df.columns)]
-        cluster_target = cluster_data['run_scored']
-        
-        model = RandomForestRegressor(n_estimators=100, random_state=42)
-        model.fit(cluster_features, cluster_target)
-        models_runs[cluster_id] = model
-
-    # Train RandomForest models for each cluster in wickets prediction
-    models_wickets = {}
+        in_cluster = cluster_runs == cluster_id
+        model = RandomForestRegressor(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                      random_state=random_state, n_jobs=threads_per_worker)
+        jobs.append(delayed(fit_cluster_model)(model, features_runs[in_cluster], target_runs[in_cluster]))
+
     for cluster_id in range(kmeans_wickets.n_clusters):
-        cluster_data = data[data['cluster_wickets'] == cluster_id]
-        cluster_features = cluster_data[['ball_delivered', 'run_given'] + list(against_team_encoded_df.columns)]
-        cluster_target = cluster_data['wicket']
-        
-        model = RandomForestClassifier(n_estimators=100, random_state=42)
-        model.fit(cluster_features, cluster_target)
-        models_wickets[cluster_id] = model
+        in_cluster = cluster_wickets == cluster_id
+        model = RandomForestClassifier(n_estimators=n_estimators, max_depth=max_depth, min_samples_leaf=min_samples_leaf,
+                                       random_state=random_state, n_jobs=threads_per_worker)
+        jobs.append(delayed(fit_cluster_model)(model, features_wickets[in_cluster], target_wickets[in_cluster]))
+
+    with stage('forest_fit', rows_in=2 * len(data)):
+        fitted = Parallel(n_jobs=workers)(jobs)
+        count('sklearn.fit', len(jobs))
+    models_runs = dict(enumerate(fitted[:kmeans_runs.n_clusters]))
+    models_wickets = dict(enumerate(fitted[kmeans_runs.n_clusters:]))
 
     return models_runs, models_wickets, kmeans_runs, kmeans_wickets
 
+# The original model family: KMeans clusters with one random forest per cluster
+def fit_cluster_forest(data, against_team_encoded, encoder, params, n_jobs):
+    models_runs, models_wickets, kmeans_runs, kmeans_wickets = train_models(data, against_team_encoded, n_jobs=n_jobs, encoder=encoder, **params)
+    return {'models_runs': models_runs, 'models_wickets': models_wickets, 'kmeans_runs': kmeans_runs, 'kmeans_wickets': kmeans_wickets}
+
+# Load fitted models from the artifact store, retraining only when the data file or parameters changed;
+# without explicit params, the ones tuning.py stored for this store are used, else TRAINING_PARAMS
+# With flatten=True every forest is exported to flat node arrays and that smaller form is what gets stored and loaded.
+# When data is only part of the file (e.g. a backtest fold), scope names that part so its models are stored apart.
+@profiled()
+def load_or_train_models(transformed_file, data, params=None, store_dir=MODEL_STORE_DIR, n_jobs=TRAINING_N_JOBS,
+                         encoding=OPPONENT_ENCODING, backend=MODEL_BACKEND, flatten=False, scope=None):
+    if backend not in MODEL_BACKENDS:
+        raise ValueError(f"Unknown model backend {backend!r}, expected one of {list(MODEL_BACKENDS)}")
+    if params is None:
+        params = load_tuned_params(store_dir) or TRAINING_PARAMS
+    options = {**params, 'encoding': encoding, 'backend': backend, 'flatten': flatten}
+    if scope is not None:
+        options['scope'] = scope
+    key = store_key(transformed_file, options)
+    artifacts = load_artifacts(key, store_dir)
+    if artifacts is not None:
+        return artifacts
+
+    if flatten:
+        artifacts = flatten_models(load_or_train_models(transformed_file, data, params, store_dir, n_jobs, encoding, backend, scope=scope))
+    else:
+        artifacts = fit_models(data, params, n_jobs, encoding, backend)
+    artifacts['key'] = key
+    save_artifacts(artifacts, key, store_dir)
+    return artifacts
+
+# Fit one backend's models on a frame, without touching the artifact store
+def fit_models(data, params=TRAINING_PARAMS, n_jobs=TRAINING_N_JOBS, encoding=OPPONENT_ENCODING, backend=MODEL_BACKEND):
+    # The sparse encoding leaves the frame untouched, so only the dense one needs a private copy
+    train_data, encoder, against_team_encoded_df = preprocess_data(data if encoding == 'sparse' else data.copy(), encoding)
+    artifacts = MODEL_BACKENDS[backend]['fit'](train_data, against_team_encoded_df, encoder, params, n_jobs)
+    opponent_columns = encoded_columns(against_team_encoded_df, encoder)
+    artifacts.update({
+        'encoder': encoder,
+        'features_runs': ['ball_faced'] + opponent_columns,
+        'features_wickets': ['ball_delivered', 'run_given'] + opponent_columns,
+        'encoding': encoding,
+        'backend': backend,
+    })
+    return artifacts
+
 # Predict runs and wickets for given players against a specific team
-def predict_runs_and_wickets(player_names, against_team, models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets):
+def predict_runs_and_wickets(player_names, against_team, models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets,
+                             encoding='dense'):
+    pairs = [(player_name, against_team) for player_name in player_names]
+    batch = predict_runs_and_wickets_batch(pairs, models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets,
+                                           encoding=encoding)
+
     predictions = {}
-    for player_name in player_names:
-        player_data = data[data['player'] == player_name]
-        if not player_data.empty:
-            against_team_encoded = encoder.transform([[against_team]])
-            against_team_encoded_df = pd.DataFrame(against_team_encoded.toarray(), columns=encoder.get_feature_names_out(['against_team']))
-            
-            avg_balls_faced = player_data['ball_faced'].mean()
-            avg_ball_delivered = player_data['ball_delivered'].mean()
-            avg_run_given = player_data['run_given'].mean()
-            
-            input_data_runs = pd.DataFrame([[avg_balls_faced] + list(against_team_encoded_df.iloc[0])], columns=features_runs.columns)
-            input_data_wickets = pd.DataFrame([[avg_ball_delivered, avg_run_given] + list(against_team_encoded_df.iloc[0])], columns=features_wickets.columns)
-            
-            cluster_id_runs = kmeans_runs.predict(input_data_runs)[0]
-            cluster_id_wickets = kmeans_wickets.predict(input_data_wickets)[0]
-            
-            predicted_runs = models_runs[cluster_id_runs].predict(input_data_runs)[0]
-            predicted_wickets = models_wickets[cluster_id_wickets].predict(input_data_wickets)[0]
-            
-            predictions[player_name] = {
-                'predicted_runs': predicted_runs,
-                'predicted_wickets': predicted_wickets
+    for row in batch.itertuples(index=False):
+        if pd.notna(row.predicted_runs):
+            predictions[row.player] = {
+                'predicted_runs': row.predicted_runs,
+                'predicted_wickets': row.predicted_wickets
             }
         else:
-            predictions[player_name] = {
+            predictions[row.player] = {
                 'predicted_runs': None,
                 'predicted_wickets': None
             }
     return predictions
 
+# Average balls faced, balls delivered and runs given per player, computed in a single groupby
+@profiled()
+def player_averages(data):
+    return data.groupby('player', observed=True)[['ball_faced', 'ball_delivered', 'run_given']].mean()
+
+# Send every row to the model of its cluster, with one predict call per cluster
+def predict_by_cluster(models, cluster_ids, features):
+    predictions = np.empty(features.shape[0])
+    for cluster_id in np.unique(cluster_ids):
+        in_cluster = cluster_ids == cluster_id
+        predictions[in_cluster] = models[cluster_id].predict(features[in_cluster])
+        count('sklearn.predict')
+    return predictions
+
+# Predict runs and wickets for any number of (player, against_team) pairs using batched model calls
+def predict_runs_and_wickets_batch(pairs, models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets, averages=None,
+                                   encoding='dense'):
+    artifacts = {
+        'models_runs': models_runs, 'models_wickets': models_wickets, 'kmeans_runs': kmeans_runs, 'kmeans_wickets': kmeans_wickets,
+        'encoder': encoder, 'features_runs': features_runs, 'features_wickets': features_wickets, 'encoding': encoding,
+    }
+    return predict_pairs(pairs, data, artifacts, averages)
+
+# Predict runs and wickets for (player, against_team) pairs with whichever backend produced the artifacts;
+# with a PredictionCache only the pairs it has not seen for these models and averages reach the models
+@profiled()
+def predict_pairs(pairs, data, artifacts, averages=None, cache=None):
+    if averages is None:
+        averages = player_averages(data)
+
+    batch = pd.DataFrame(pairs, columns=['player', 'against_team'])
+    batch['predicted_runs'] = np.nan
+    batch['predicted_wickets'] = np.nan
+    known = batch['player'].isin(averages.index).to_numpy()
+    if cache is not None and 'key' in artifacts and known.any():
+        namespace = (artifacts['key'], data_version(averages))
+        with stage('prediction_cache', rows_in=int(known.sum())):
+            cached = cache.get_many(namespace, list(batch.loc[known, ['player', 'against_team']].itertuples(index=False, name=None)))
+            count('prediction_cache.hit', len(cached))
+            count('prediction_cache.miss', int(known.sum()) - len(cached))
+        if cached:
+            found = pd.DataFrame([(player, team, runs, wickets) for (player, team), (runs, wickets) in cached.items()],
+                                 columns=['player', 'against_team', 'predicted_runs', 'predicted_wickets'])
+            values = batch[['player', 'against_team']].merge(found, on=['player', 'against_team'], how='left')
+            batch['predicted_runs'] = values['predicted_runs'].to_numpy(dtype=float)
+            batch['predicted_wickets'] = values['predicted_wickets'].to_numpy(dtype=float)
+        missing = known & batch['predicted_runs'].isna().to_numpy()
+        if missing.any():
+            # Pairs repeated within the batch are predicted once
+            fresh = predict_pairs(batch.loc[missing, ['player', 'against_team']].drop_duplicates(), data, artifacts, averages)
+            cache.put_many(namespace, {(player, team): (float(runs), float(wickets)) for player, team, runs, wickets
+                                       in fresh.itertuples(index=False, name=None)})
+            values = batch[['player', 'against_team']].merge(fresh, on=['player', 'against_team'], how='left')
+            batch.loc[missing, 'predicted_runs'] = values.loc[missing, 'predicted_runs'].to_numpy(dtype=float)
+            batch.loc[missing, 'predicted_wickets'] = values.loc[missing, 'predicted_wickets'].to_numpy(dtype=float)
+        return batch
+    if not known.any():
+        return batch
+
+    with stage('encode_opponents', rows_in=int(known.sum())):
+        rows = batch.loc[known, ['player', 'against_team']].join(averages, on='player')
+        against_team_encoded = artifacts['encoder'].transform(rows[['against_team']])
+        count('sklearn.transform')
+
+    predict = MODEL_BACKENDS[artifacts.get('backend', 'cluster_forest')]['predict']
+    runs, wickets = predict(artifacts, rows, against_team_encoded, artifacts.get('encoding', 'dense'))
+    batch.loc[known, 'predicted_runs'] = runs
+    batch.loc[known, 'predicted_wickets'] = wickets
+    return batch
+
+# Runs and wickets model inputs of some rows, in the layout the cluster models were trained on
+def cluster_forest_features(models, rows, against_team_encoded, encoding):
+    features_runs, features_wickets = models['features_runs'], models['features_wickets']
+    with stage('build_features', rows_in=len(rows)):
+        if encoding == 'sparse':
+            input_data_runs = model_features(rows, ['ball_faced'], against_team_encoded.tocsr(), None)
+            input_data_wickets = model_features(rows, ['ball_delivered', 'run_given'], against_team_encoded.tocsr(), None)
+        else:
+            against_team_encoded = against_team_encoded.toarray()
+            input_data_runs = pd.DataFrame(np.column_stack([rows['ball_faced'], against_team_encoded]), columns=list(features_runs))
+            input_data_wickets = pd.DataFrame(np.column_stack([rows['ball_delivered'], rows['run_given'], against_team_encoded]), columns=list(features_wickets))
+    return input_data_runs, input_data_wickets
+
+# Assign each row to its KMeans cluster and predict it with that cluster's forest
+def predict_cluster_forest(models, rows, against_team_encoded, encoding):
+    input_data_runs, input_data_wickets = cluster_forest_features(models, rows, against_team_encoded, encoding)
+    with stage('assign_clusters', rows_in=len(rows)):
+        cluster_ids_runs = models['kmeans_runs'].predict(input_data_runs)
+        cluster_ids_wickets = models['kmeans_wickets'].predict(input_data_wickets)
+        count('sklearn.predict', 2)
+
+    with stage('cluster_model_predict', rows_in=2 * len(rows)):
+        runs = predict_by_cluster(models['models_runs'], cluster_ids_runs, input_data_runs)
+        wickets = predict_by_cluster(models['models_wickets'], cluster_ids_wickets, input_data_wickets)
+    return runs, wickets
+
+# Model families that load_or_train_models can train; each fits a model set from the preprocessed frame and
+# opponent encoding, and predicts runs and wickets for rows of per-player averages plus their encoded opponent
+MODEL_BACKENDS = {
+    'cluster_forest': {'fit': fit_cluster_forest, 'predict': predict_cluster_forest},
+    'hist_gb': {'fit': fit_hist_gb, 'predict': predict_hist_gb},
+    'global_forest': {'fit': fit_global_forest, 'predict': predict_global_forest},
+}
+
 # Calculate impact scores for players based on their predicted runs and wickets
 def calculate_impact_score(predictions):
-    impact_scores = {}
-    for player_name, prediction in predictions.items():
-        if prediction['predicted_runs'] is not None and prediction['predicted_wickets'] is not None:
-            impact_score = (prediction['predicted_runs'] * 1.4) + (prediction['predicted_wickets'] * 25)
-            impact_scores[player_name] = impact_score
-        else:
-            impact_scores[player_name] = None
-    return impact_scores
+    table = pd.DataFrame.from_dict(predictions, orient='index', columns=['predicted_runs', 'predicted_wickets'], dtype=float)
+    impact_scores = score_table(table, 'impact')
+    return {player_name: (None if np.isnan(score) else float(score)) for player_name, score in impact_scores.items()}
 
 # Calculate the player's historical performance against a specific team
+@profiled()
 def performance_against_team(player_name, team_name, df):
     player_team_data = df[(df['player'] == player_name) & (df['against_team'] == team_name)]
     matches_played = player_team_data['match_id'].nunique()
@@ -144,52 +357,50 @@ def performance_against_team(player_name, team_name, df):
 
 # Calculate fantasy points for a player based on their performance stats
 def calculate_fantasy_points(player_stats):
-    points = 0
+    if isinstance(player_stats, dict):
+        return float(score_table(pd.DataFrame([player_stats]), 'history').iloc[0])
+    return score_table(player_stats, 'history')
 
-    points += player_stats['total_runs'] * 1.4
-    points += player_stats['total_4s'] * 1
-    points += player_stats['total_6s'] * 2
-    points += player_stats['total_wickets'] * 25
-    points += player_stats['total_50s'] * 8
-    points += player_stats['total_100s'] * 16
+# Score the players of any number of fixtures, each given as (fixture_id, team_a, squad_a, team_b, squad_b)
+@profiled()
+def score_fixtures(fixtures, data, artifacts, performance_index, averages=None, cache=None):
+    entries = []
+    for fixture_id, team_a, squad_a, team_b, squad_b in fixtures:
+        entries += [(fixture_id, team_a, player_name, team_b) for player_name in squad_a]
+        entries += [(fixture_id, team_b, player_name, team_a) for player_name in squad_b]
+    entries = pd.DataFrame(entries, columns=['fixture_id', 'team', 'player', 'against_team'])
 
-    return points
+    # Every distinct (player, opponent) pair is predicted and looked up once, however many fixtures share it
+    pairs = list(entries[['player', 'against_team']].drop_duplicates().itertuples(index=False, name=None))
+    scores = predict_pairs(pairs, data, artifacts, averages, cache)
+    with stage('fantasy_points', rows_in=len(pairs)):
+        history = bulk_performance_lookup(performance_index, pairs)
+        scores['fantasy_points'] = calculate_fantasy_points(history).to_numpy(dtype=float)
+    scores['impact_score'] = score_table(scores, 'impact').fillna(0)
+    scores['combined_score'] = scores['fantasy_points'] + scores['impact_score']
+
+    results = entries.merge(scores, on=['player', 'against_team'], how='left')
+    results = results.sort_values(['fixture_id', 'combined_score'], ascending=[True, False], kind='stable')
+    results['rank'] = results.groupby('fixture_id').cumcount() + 1
+    return results.reset_index(drop=True)
 
 # Main function to execute the entire process
-def main():
+def main(n_lineups=1, backend=MODEL_BACKEND, flatten=False, cache_dir=PREDICTION_CACHE_DIR, store_dir=DATA_STORE_DIR, **filters):
     transformed_file = 'transformed_match_data.csv'
-    data = load_data(transformed_file)
-    data, encoder, against_team_encoded_df = preprocess_data(data)
-    models_runs, models_wickets, kmeans_runs, kmeans_wickets = train_models(data, against_team_encoded_df)
-
-    teams = [['MS Dhoni', 'Shaik Rasheed', 'Shivam Dube', 'RD Gaikwad', 'DL Chahar', 'RA Jadeja', 'AM Rahane', 'M Theekshana', 'TU Deshpande', 'Simarjeet Singh', 'MM Ali'], ['Rashid Khan', 'Shubman Gill', 'Mohammed Shami', 'WP Saha', 'DA Miller', 'V Shankar', 'MS Wade', 'J Yadav', 'KS Williamson', 'R Sai Kishore', 'MM Sharma']]
-    against_teams = ['Gujarat Titans', 'Chennai Super Kings']
-
-    all_impact_scores = {}
-    for i, team in enumerate(teams):
-        against_team = against_teams[i]
-        predictions = predict_runs_and_wickets(team, against_team, models_runs, models_wickets, data, encoder, kmeans_runs, kmeans_wickets, features_runs, features_wickets)
-        impact_scores = calculate_impact_score(predictions)
-        all_impact_scores.update(impact_scores)
-
-
-
-    df = pd.read_csv('transformed_match_data.csv')
-    fantasy_points = {}
-    for team in teams:
-        for player_name in team:
-            player_stats = performance_against_team(player_name, against_team, df)
-            fantasy_points[player_name] = calculate_fantasy_points(player_stats)
+    # One read serves the models, the scoring and the role inference
+    columns = DATA_COLUMNS + [column for column in ROLE_COLUMNS if column not in DATA_COLUMNS]
+    data = load_data(transformed_file, columns, store_dir=store_dir, **filters)
+    source, scope = data_source(transformed_file, store_dir, **filters)
+    artifacts = load_or_train_models(source, data, backend=backend, flatten=flatten, scope=scope)
 
-    combined_scores = {}
-    for player_name in fantasy_points.keys():
-        impact_score = all_impact_scores.get(player_name, 0)
-        if impact_score is None:
-            impact_score = 0
-        combined_score = fantasy_points[player_name] + impact_score
-        combined_scores[player_name] = combined_score
+    csk = ['MS Dhoni', 'Shaik Rasheed', 'Shivam Dube', 'RD Gaikwad', 'DL Chahar', 'RA Jadeja', 'AM Rahane', 'M Theekshana', 'TU Deshpande', 'Simarjeet Singh', 'MM Ali']
+    gt = ['Rashid Khan', 'Shubman Gill', 'Mohammed Shami', 'WP Saha', 'DA Miller', 'V Shankar', 'MS Wade', 'J Yadav', 'KS Williamson', 'R Sai Kishore', 'MM Sharma']
+    fixtures = [(1, 'Chennai Super Kings', csk, 'Gujarat Titans', gt)]
 
-    ranked_players = sorted(combined_scores.items(), key=lambda x: x[1], reverse=True)
-    top_11_players = ranked_players[:11]
-    return top_11_players
+    performance_index = history_performance_index(data, transformed_file, **filters)
+    results = score_fixtures(fixtures, data, artifacts, performance_index, cache=PredictionCache(cache_dir=cache_dir))
 
+    # Pick legal XIs (roles, per-team cap, credits) rather than just the eleven highest scores
+    roles = infer_roles(data, csk + gt)
+    pool = results.assign(role=results['player'].map(roles), score=results['combined_score'])
+    return optimal_lineups(pool, n_lineups)
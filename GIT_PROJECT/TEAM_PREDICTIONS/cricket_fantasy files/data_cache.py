@@ -0,0 +1,127 @@
+import json
+import os
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    CACHE_FORMAT = 'parquet'
+except ImportError:
+    CACHE_FORMAT = 'pickle'
+
+CACHE_DIR = '.data_cache'
+# Appended chunks a cache may collect before the next append folds them into the base file
+CACHE_CHUNKS = 32
+
+# Shrink a freshly parsed frame: repeated names become categoricals and counts the smallest integer type
+def narrow_dtypes(df):
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object or pd.api.types.is_string_dtype(series):
+            if series.nunique() <= len(series) // 2:
+                df[column] = series.astype('category')
+        elif pd.api.types.is_integer_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series):
+            # Counts that picked up a float dtype in the CSV are stored as integers again
+            if series.notna().all() and (series == series.round()).all():
+                df[column] = pd.to_numeric(series.astype('int64'), downcast='integer')
+    return df
+
+# Cache file and metadata file for a source CSV
+def cache_paths(source_file, cache_dir=CACHE_DIR):
+    name = os.path.splitext(os.path.basename(source_file))[0]
+    return os.path.join(cache_dir, f'{name}.{CACHE_FORMAT}'), os.path.join(cache_dir, f'{name}.json')
+
+# Chunk files of appended rows next to a cache file, oldest first
+def chunk_files(source_file, cache_dir=CACHE_DIR):
+    if not os.path.isdir(cache_dir):
+        return []
+    name = os.path.splitext(os.path.basename(source_file))[0]
+    prefix, suffix = f'{name}.part', f'.{CACHE_FORMAT}'
+    return [os.path.join(cache_dir, file) for file in sorted(os.listdir(cache_dir))
+            if file.startswith(prefix) and file.endswith(suffix) and file[len(prefix):-len(suffix)].isdigit()]
+
+def write_frame(df, path):
+    if CACHE_FORMAT == 'parquet':
+        df.to_parquet(path, index=False)
+    else:
+        df.to_pickle(path)
+
+def read_frame(path, columns=None):
+    if CACHE_FORMAT == 'parquet':
+        return pd.read_parquet(path, columns=None if columns is None else list(columns))
+    df = pd.read_pickle(path)
+    return df if columns is None else df[list(columns)]
+
+# Identify the current state of the source so a rewritten CSV invalidates its cache
+def source_signature(source_file):
+    stat = os.stat(source_file)
+    return {'source': os.path.abspath(source_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+def write_meta(source_file, cache_dir=CACHE_DIR):
+    _, meta_file = cache_paths(source_file, cache_dir)
+    with open(meta_file, 'w') as f:
+        json.dump(source_signature(source_file), f)
+
+# Write a frame to the cache, replacing any appended chunks, and record which state of the source it reflects.
+# The metadata goes first and comes back last, so an interrupted write leaves a cache that is rebuilt.
+def write_cache(df, source_file, cache_dir=CACHE_DIR):
+    cache_file, meta_file = cache_paths(source_file, cache_dir)
+    os.makedirs(cache_dir, exist_ok=True)
+    if os.path.exists(meta_file):
+        os.remove(meta_file)
+    for chunk in chunk_files(source_file, cache_dir):
+        os.remove(chunk)
+    write_frame(df, cache_file)
+    write_meta(source_file, cache_dir)
+
+# Parse the source CSV once and store it in columnar form with narrow dtypes
+def build_cache(source_file, cache_dir=CACHE_DIR):
+    df = narrow_dtypes(pd.read_csv(source_file))
+    write_cache(df, source_file, cache_dir)
+    return df
+
+# Whether the cached copy of a source file is present and matches the given (default: current) source state
+def cache_is_fresh(source_file, cache_dir=CACHE_DIR, signature=None):
+    cache_file, meta_file = cache_paths(source_file, cache_dir)
+    if not (os.path.exists(cache_file) and os.path.exists(meta_file)):
+        return False
+    with open(meta_file) as f:
+        return json.load(f) == (signature or source_signature(source_file))
+
+# Read a source CSV through the cache, loading only the requested columns
+def read_cached(source_file, columns=None, cache_dir=CACHE_DIR):
+    if not cache_is_fresh(source_file, cache_dir):
+        df = build_cache(source_file, cache_dir)
+        return df if columns is None else df[list(columns)]
+
+    return read_cached_file(source_file, cache_dir, columns)
+
+# Read the cache file and its appended chunks, without checking them against the source
+def read_cached_file(source_file, cache_dir=CACHE_DIR, columns=None):
+    cache_file, _ = cache_paths(source_file, cache_dir)
+    chunks = chunk_files(source_file, cache_dir)
+    df = read_frame(cache_file, columns)
+    if not chunks:
+        return df
+    # Chunks carry their own categories, so the combined frame is narrowed again
+    return narrow_dtypes(pd.concat([df] + [read_frame(chunk, columns) for chunk in chunks], ignore_index=True))
+
+# Extend the cache with rows just appended to its source instead of re-parsing the whole CSV: the new
+# rows are written as one more chunk, and only every CACHE_CHUNKS appends are the chunks folded into the
+# base file. A cache that was already stale before the append is left to be rebuilt on the next read.
+def append_cached(source_file, new_rows, previous_signature, cache_dir=CACHE_DIR):
+    if not cache_is_fresh(source_file, cache_dir, previous_signature):
+        return
+    chunks = chunk_files(source_file, cache_dir)
+    # The cache holds the columns of the source's header, in its order
+    columns = pd.read_csv(source_file, nrows=0).columns
+    if len(chunks) >= CACHE_CHUNKS:
+        cached = read_cached_file(source_file, cache_dir)
+        write_cache(narrow_dtypes(pd.concat([cached, new_rows[columns]], ignore_index=True)), source_file, cache_dir)
+        return
+    name = os.path.splitext(os.path.basename(source_file))[0]
+    number = int(chunks[-1].rsplit('.part', 1)[1].split('.')[0]) + 1 if chunks else 0
+    chunk = os.path.join(cache_dir, f'{name}.part{number:06d}.{CACHE_FORMAT}')
+    write_frame(narrow_dtypes(new_rows[columns].reset_index(drop=True)), chunk)
+    write_meta(source_file, cache_dir)
@@ -0,0 +1,247 @@
+import argparse
+import json
+import os
+import shutil
+import numpy as np
+import pandas as pd
+from data_cache import CACHE_FORMAT, narrow_dtypes, read_cached, source_signature
+
+DATA_STORE_DIR = 'league_store'
+# League of a matches file that has no league column, such as the original IPL file
+DEFAULT_LEAGUE = 'IPL'
+
+# Stored tables: the column that holds each row's match id, and the columns a players filter looks at
+TABLES = {
+    'matches': {'match_column': 'id', 'player_columns': []},
+    'ball_by_ball': {'match_column': 'id', 'player_columns': ['batsman', 'bowler', 'non_striker']},
+    'innings': {'match_column': 'match_id', 'player_columns': ['player']},
+}
+
+def catalog_path(store_dir=DATA_STORE_DIR):
+    return os.path.join(store_dir, 'catalog.json')
+
+# The catalog lists every partition with its row count and the teams that played in it, so a query
+# can pick its partitions without opening any data file
+def load_catalog(store_dir=DATA_STORE_DIR):
+    path = catalog_path(store_dir)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No data store at {store_dir!r}; build one with data_store.py build")
+    with open(path) as f:
+        return json.load(f)
+
+def save_catalog(catalog, store_dir=DATA_STORE_DIR):
+    os.makedirs(store_dir, exist_ok=True)
+    path = catalog_path(store_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump(catalog, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+# File of one table's partition, relative to the store directory
+def partition_file(table, league, season):
+    return os.path.join(table, f'league={league}', f'season={season}.{CACHE_FORMAT}')
+
+# League and season of every match; seasons default to the year the match was played in
+def match_partitions(matches, league=DEFAULT_LEAGUE):
+    return pd.DataFrame({
+        'match_id': matches['id'].astype(int).to_numpy(),
+        'league': matches['league'].astype(str).to_numpy() if 'league' in matches.columns else league,
+        'season': (matches['season'].astype(int) if 'season' in matches.columns
+                   else pd.to_datetime(matches['date'].astype(str)).dt.year).to_numpy(),
+    })
+
+def write_partition(df, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    if CACHE_FORMAT == 'parquet':
+        df.to_parquet(path + '.tmp', index=False)
+    else:
+        df.to_pickle(path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+# Split the flat sources of one league into league/season partitions and record them in the catalog.
+# Partitions the import covers are replaced; other leagues, and with seasons given the league's other
+# seasons, are left as they are, so adding a competition or refreshing a season never rewrites the rest.
+def import_league(matches_file, byb_file, transformed_file, store_dir=DATA_STORE_DIR, league=DEFAULT_LEAGUE, seasons=None):
+    matches = read_cached(matches_file)
+    partitions = match_partitions(matches, league)
+    if seasons is not None:
+        partitions = partitions[partitions['season'].isin(seasons)]
+    teams = pd.concat([matches[['id', 'team1']].set_axis(['match_id', 'team'], axis=1),
+                       matches[['id', 'team2']].set_axis(['match_id', 'team'], axis=1)])
+    teams = teams.astype({'match_id': int, 'team': str}).merge(partitions, on='match_id')
+    teams = teams.groupby(['league', 'season'])['team'].unique()
+
+    try:
+        catalog = load_catalog(store_dir)
+    except FileNotFoundError:
+        catalog = {'format': CACHE_FORMAT, 'partitions': [], 'sources': {}}
+    leagues = set(partitions['league'])
+    catalog['partitions'] = [entry for entry in catalog['partitions']
+                             if entry['league'] not in leagues or (seasons is not None and entry['season'] not in seasons)]
+    if seasons is None:
+        for table in TABLES:
+            for partition_league in leagues:
+                shutil.rmtree(os.path.join(store_dir, table, f'league={partition_league}'), ignore_errors=True)
+
+    sources = {'matches': matches, 'ball_by_ball': read_cached(byb_file), 'innings': read_cached(transformed_file)}
+    for table, df in sources.items():
+        ids = df[TABLES[table]['match_column']].astype(int).to_numpy()
+        located = partitions.set_index('match_id').reindex(ids)
+        keep = located['league'].notna().to_numpy()
+        kept = df[keep].reset_index(drop=True)
+        groups = pd.DataFrame({'league': located['league'].to_numpy()[keep], 'season': located['season'].to_numpy()[keep]})
+        for (partition_league, season), rows in groups.groupby(['league', 'season'], sort=True).indices.items():
+            season = int(season)
+            path = partition_file(table, partition_league, season)
+            part = kept.iloc[rows].reset_index(drop=True)
+            # A partition only keeps the names that occur in it, not every league's
+            part = narrow_dtypes(part.apply(lambda column: column.cat.remove_unused_categories()
+                                            if isinstance(column.dtype, pd.CategoricalDtype) else column))
+            write_partition(part, os.path.join(store_dir, path))
+            catalog['partitions'].append({
+                'table': table, 'league': partition_league, 'season': season, 'path': path, 'rows': len(part),
+                'teams': sorted(teams.get((partition_league, season), [])),
+            })
+
+    catalog['partitions'].sort(key=lambda entry: (entry['table'], entry['league'], entry['season']))
+    for partition_league in sorted(leagues):
+        catalog['sources'][partition_league] = {
+            'matches': source_signature(matches_file), 'ball_by_ball': source_signature(byb_file),
+            'innings': source_signature(transformed_file),
+        }
+    save_catalog(catalog, store_dir)
+    return catalog
+
+# Drop a league and every file of it from the store
+def remove_league(league, store_dir=DATA_STORE_DIR):
+    catalog = load_catalog(store_dir)
+    catalog['partitions'] = [entry for entry in catalog['partitions'] if entry['league'] != league]
+    catalog['sources'].pop(league, None)
+    save_catalog(catalog, store_dir)
+    for table in TABLES:
+        shutil.rmtree(os.path.join(store_dir, table, f'league={league}'), ignore_errors=True)
+
+# Filters a loader accepts; any of them routes the read through the store
+FILTERS = ['league', 'seasons', 'teams', 'players']
+
+def as_list(value):
+    return None if value is None else [value] if isinstance(value, (str, int)) else list(value)
+
+# Catalog entries of a table's partitions that can hold rows for the given leagues, seasons and teams
+def select_partitions(catalog, table, league=None, seasons=None, teams=None):
+    leagues, seasons, teams = as_list(league), as_list(seasons), as_list(teams)
+    return [
+        entry for entry in catalog['partitions']
+        if entry['table'] == table
+        and (leagues is None or entry['league'] in leagues)
+        and (seasons is None or entry['season'] in seasons)
+        and (teams is None or not set(teams).isdisjoint(entry['teams']))
+    ]
+
+# Files the rows of a query come from; a model trained on the query is identified by their contents
+def partition_files(table, store_dir=DATA_STORE_DIR, league=None, seasons=None, teams=None, players=None):
+    entries = select_partitions(load_catalog(store_dir), table, league, seasons, teams)
+    return [os.path.join(store_dir, entry['path']) for entry in entries]
+
+# The filters of a query that were actually given, as lists
+def active_filters(filters):
+    unknown = set(filters) - set(FILTERS)
+    if unknown:
+        raise TypeError(f"Unknown data filters {sorted(unknown)}, expected some of {FILTERS}")
+    return {name: as_list(value) for name, value in filters.items() if value is not None}
+
+# What models trained on a query's innings are keyed on: the flat file when nothing is filtered, otherwise
+# the partition files the rows are read from plus the filters, since teams and players keep only some rows
+def data_source(transformed_file, store_dir=DATA_STORE_DIR, **filters):
+    filters = active_filters(filters)
+    if not filters:
+        return transformed_file, None
+    return partition_files('innings', store_dir, **filters), filters
+
+# Row filter in disjunctive normal form: any one of the conjunctions has to hold. The parquet reader
+# applies it while scanning; pickled partitions are filtered after loading.
+def row_filters(table, match_ids=None, players=None):
+    base = [] if match_ids is None else [(TABLES[table]['match_column'], 'in', match_ids)]
+    if players is None:
+        return [base] if base else None
+    if not TABLES[table]['player_columns']:
+        raise ValueError(f"The {table} table has no player columns to filter on")
+    return [base + [(column, 'in', players)] for column in TABLES[table]['player_columns']]
+
+def filter_mask(df, filters):
+    mask = np.zeros(len(df), dtype=bool)
+    for conjunction in filters:
+        matches = np.ones(len(df), dtype=bool)
+        for column, _, values in conjunction:
+            matches &= df[column].isin(values).to_numpy()
+        mask |= matches
+    return mask
+
+def read_partition(path, columns, filters):
+    read_columns = None if columns is None else list(dict.fromkeys(
+        list(columns) + [column for conjunction in filters or [] for column, _, _ in conjunction]))
+    if CACHE_FORMAT == 'parquet':
+        df = pd.read_parquet(path, columns=read_columns, filters=filters)
+    else:
+        df = pd.read_pickle(path)
+        df = df[filter_mask(df, filters)] if filters else df
+        df = df if read_columns is None else df[read_columns]
+    return df if columns is None else df[list(columns)]
+
+# Ids of the matches the given teams played in the selected partitions
+def team_match_ids(store_dir, league=None, seasons=None, teams=None):
+    return read_table('matches', ['id'], store_dir, league, seasons, teams)['id'].astype(int).tolist()
+
+# Read one table of the store, opening only the partitions of the requested leagues and seasons (and,
+# with teams, only those the teams played in) and only the requested columns. Teams keep the rows of
+# their matches; players keep the rows those players appear in.
+def read_table(table, columns=None, store_dir=DATA_STORE_DIR, league=None, seasons=None, teams=None, players=None):
+    if table not in TABLES:
+        raise ValueError(f"Unknown table {table!r}, expected one of {list(TABLES)}")
+    teams, players = as_list(teams), as_list(players)
+    entries = select_partitions(load_catalog(store_dir), table, league, seasons, teams)
+    if table == 'matches':
+        filters = row_filters(table, players=players)
+        if teams is not None:
+            filters = [[('team1', 'in', teams)], [('team2', 'in', teams)]]
+    else:
+        match_ids = None if teams is None or not entries else team_match_ids(store_dir, league, seasons, teams)
+        filters = row_filters(table, match_ids, players)
+
+    frames = [read_partition(os.path.join(store_dir, entry['path']), columns, filters) for entry in entries]
+    if not frames:
+        raise ValueError(f"No {table} partitions match league={league!r}, seasons={seasons!r}, teams={teams!r}")
+    # Partitions carry their own categories, so the combined frame is narrowed again
+    return narrow_dtypes(pd.concat(frames, ignore_index=True)) if len(frames) > 1 else frames[0]
+
+# Rows and partitions per table, league and season
+def catalog_summary(catalog):
+    partitions = pd.DataFrame(catalog['partitions'])
+    if partitions.empty:
+        return partitions
+    return partitions.groupby(['league', 'table']).agg(seasons=('season', 'size'), first=('season', 'min'), last=('season', 'max'),
+                                                       rows=('rows', 'sum'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Partitioned league/season data store')
+    parser.add_argument('--store-dir', default=DATA_STORE_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="import one league's flat files into the store")
+    build.add_argument('--matches', default='IPL Mathces 2008-2023.csv')
+    build.add_argument('--byb', default='IPl Ball-by-Ball 2008-2023.csv')
+    build.add_argument('--data', default='transformed_match_data.csv')
+    build.add_argument('--league', default=DEFAULT_LEAGUE, help="league of matches files without a league column")
+    build.add_argument('--seasons', type=int, nargs='+', help='only refresh these seasons')
+    remove = commands.add_parser('remove', help='drop a league from the store')
+    remove.add_argument('league')
+    commands.add_parser('catalog', help='list the stored leagues and seasons')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        catalog = import_league(args.matches, args.byb, args.data, args.store_dir, args.league, args.seasons)
+    elif args.command == 'remove':
+        remove_league(args.league, args.store_dir)
+        catalog = load_catalog(args.store_dir)
+    else:
+        catalog = load_catalog(args.store_dir)
+    print(catalog_summary(catalog).to_string())
@@ -0,0 +1,138 @@
+import argparse
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from sklearn.model_selection import train_test_split
+from cricket_predictions import (DATA_COLUMNS, OPPONENT_ENCODING, TRAINING_N_JOBS, TRAINING_PARAMS, cluster_forest_features,
+                                 fit_models, load_data)
+from profiling import count, profiled, stage
+
+TEST_SIZE = 0.2
+SPLITS = ['match', 'row']
+CALIBRATION_BINS = 10
+
+# Boolean mask of held-out rows. split='match' holds out whole matches, so no innings of a test match
+# (and none of its opponents' innings) is seen in training; split='row' holds out individual rows.
+def holdout_mask(data, test_size=TEST_SIZE, random_state=42, split='match'):
+    if split not in SPLITS:
+        raise ValueError(f"Unknown split {split!r}, expected one of {SPLITS}")
+    if split == 'row':
+        _, test_rows = train_test_split(np.arange(len(data)), test_size=test_size, random_state=random_state)
+        mask = np.zeros(len(data), dtype=bool)
+        mask[test_rows] = True
+        return mask
+    match_ids = np.unique(data['match_id'].to_numpy())
+    _, test_matches = train_test_split(match_ids, test_size=test_size, random_state=random_state)
+    return data['match_id'].isin(test_matches).to_numpy()
+
+# Predictions of one cluster's model for its rows; wickets come with the expected count and P(at least one)
+def predict_cluster(family, model, features, rows):
+    if family == 'runs':
+        return family, rows, model.predict(features), None, None
+    probabilities = model.predict_proba(features)
+    classes = np.asarray(model.classes_, dtype=float)
+    no_wicket = probabilities[:, classes == 0].sum(axis=1)
+    return family, rows, classes.take(np.argmax(probabilities, axis=1)), probabilities @ classes, 1 - no_wicket
+
+# Cluster ids and predictions of every held-out row. Rows are assigned to clusters once per family, and the
+# cluster models then predict concurrently, each for all of its rows in one call. An opponent encoding
+# already computed for the test rows can be passed in to skip encoding them again.
+def holdout_predictions(artifacts, test, n_jobs=TRAINING_N_JOBS, against_team_encoded=None):
+    if against_team_encoded is None:
+        against_team_encoded = artifacts['encoder'].transform(test[['against_team']])
+    features = dict(zip(['runs', 'wickets'], cluster_forest_features(artifacts, test, against_team_encoded, artifacts['encoding'])))
+    jobs = []
+    clusters = {}
+    for family in ['runs', 'wickets']:
+        clusters[family] = artifacts[f'kmeans_{family}'].predict(features[family])
+        count('sklearn.predict')
+        for cluster_id, model in artifacts[f'models_{family}'].items():
+            in_cluster = clusters[family] == cluster_id
+            if in_cluster.any():
+                jobs.append(delayed(predict_cluster)(family, model, features[family][in_cluster], np.flatnonzero(in_cluster)))
+
+    predictions = {
+        'runs': {'cluster': clusters['runs'], 'actual': test['run_scored'].to_numpy(dtype=float), 'predicted': np.empty(len(test))},
+        'wickets': {'cluster': clusters['wickets'], 'actual': test['wicket'].to_numpy(dtype=float), 'predicted': np.empty(len(test)),
+                    'expected': np.empty(len(test)), 'p_wicket': np.empty(len(test))},
+    }
+    with stage('cluster_model_predict', rows_in=2 * len(test)):
+        # Forest prediction releases the GIL, so threads avoid copying the models into worker processes
+        for family, rows, predicted, expected, p_wicket in Parallel(n_jobs=n_jobs, prefer='threads')(jobs):
+            predictions[family]['predicted'][rows] = predicted
+            if family == 'wickets':
+                predictions[family]['expected'][rows] = expected
+                predictions[family]['p_wicket'][rows] = p_wicket
+        count('sklearn.predict', len(jobs))
+    return {family: pd.DataFrame(columns) for family, columns in predictions.items()}
+
+# Per-cluster and overall MAE and bias of the runs model
+def runs_metrics(runs):
+    runs = runs.assign(error=(runs['predicted'] - runs['actual']).abs(), bias=runs['predicted'] - runs['actual'])
+    def summary(group):
+        return pd.Series({'rows': len(group), 'mae': group['error'].mean(), 'bias': group['bias'].mean(),
+                          'mean_actual': group['actual'].mean(), 'mean_predicted': group['predicted'].mean()})
+    table = runs.groupby('cluster')[runs.columns].apply(summary)
+    table.loc['all'] = summary(runs)
+    return table
+
+# Per-cluster and overall accuracy of the wickets model, plus how well its probabilities are calibrated:
+# expected against actual wickets, and the calibration error of P(at least one wicket)
+def wickets_metrics(wickets):
+    wickets = wickets.assign(correct=wickets['predicted'] == wickets['actual'], took_wicket=wickets['actual'] > 0)
+    def summary(group):
+        return pd.Series({'rows': len(group), 'accuracy': group['correct'].mean(), 'mae': (group['predicted'] - group['actual']).abs().mean(),
+                          'expected_wickets': group['expected'].mean(), 'actual_wickets': group['actual'].mean(),
+                          'calibration_error': expected_calibration_error(group['p_wicket'], group['took_wicket'])})
+    table = wickets.groupby('cluster')[wickets.columns].apply(summary)
+    table.loc['all'] = summary(wickets)
+    return table
+
+# Mean predicted against observed rate in equal-width probability bins
+def calibration_table(probability, outcome, bins=CALIBRATION_BINS):
+    bin_ids = np.minimum((np.asarray(probability) * bins).astype(int), bins - 1)
+    table = pd.DataFrame({'bin': bin_ids, 'predicted': np.asarray(probability), 'observed': np.asarray(outcome, dtype=float)})
+    table = table.groupby('bin').agg(rows=('predicted', 'size'), predicted=('predicted', 'mean'), observed=('observed', 'mean'))
+    table.index = [f'{b / bins:.1f}-{(b + 1) / bins:.1f}' for b in table.index]
+    return table
+
+# Row-weighted gap between predicted probability and observed rate over the calibration bins
+def expected_calibration_error(probability, outcome, bins=CALIBRATION_BINS):
+    table = calibration_table(probability, outcome, bins)
+    if table.empty:
+        return np.nan
+    return float((table['rows'] * (table['predicted'] - table['observed']).abs()).sum() / table['rows'].sum())
+
+# Evaluate already fitted cluster models on held-out rows
+def evaluate_models(artifacts, test, n_jobs=TRAINING_N_JOBS, against_team_encoded=None):
+    predictions = holdout_predictions(artifacts, test, n_jobs, against_team_encoded)
+    wickets = predictions['wickets']
+    return {
+        'runs': runs_metrics(predictions['runs']),
+        'wickets': wickets_metrics(wickets),
+        'calibration': calibration_table(wickets['p_wicket'], wickets['actual'] > 0),
+    }
+
+# Split first, then cluster and fit on the training rows only and score every model on the held-out rows
+@profiled()
+def holdout_evaluation(data, params=TRAINING_PARAMS, test_size=TEST_SIZE, split='match', n_jobs=TRAINING_N_JOBS,
+                       encoding=OPPONENT_ENCODING, mask=None):
+    if mask is None:
+        mask = holdout_mask(data, test_size, params['random_state'], split)
+    train, test = data[~mask], data[mask]
+    artifacts = fit_models(train, params, n_jobs, encoding, 'cluster_forest')
+    return evaluate_models(artifacts, test, n_jobs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Held-out evaluation of the cluster models')
+    parser.add_argument('--data', default='transformed_match_data.csv')
+    parser.add_argument('--test-size', type=float, default=TEST_SIZE)
+    parser.add_argument('--split', choices=SPLITS, default='match', help='hold out whole matches or individual rows')
+    parser.add_argument('--n-jobs', type=int, default=TRAINING_N_JOBS)
+    args = parser.parse_args()
+
+    report = holdout_evaluation(load_data(args.data, DATA_COLUMNS), test_size=args.test_size, split=args.split, n_jobs=args.n_jobs)
+    for name in ['runs', 'wickets', 'calibration']:
+        print(f"\n{name}")
+        print(report[name].round(3).to_string())
@@ -0,0 +1,130 @@
+import numpy as np
+import pandas as pd
+from scoring import score_table
+
+# Innings after which an innings counts half as much in the exponentially weighted form
+FORM_HALF_LIFE = 5
+# Innings averaged by the last-N form
+FORM_WINDOW = 3
+FORM_COLUMNS = ['innings', 'ewma_points', 'last_n_points', 'last_match']
+# Day of a player who has no innings yet, earlier than any match
+NO_DAY = np.iinfo(np.int64).min
+
+# Day number of each match id from a match_id -> date mapping; without dates every match falls on the
+# same day, so only the match ids order them
+def match_days(match_ids, dates=None):
+    if dates is None:
+        return np.zeros(len(match_ids), dtype=np.int64)
+    days = pd.to_datetime(pd.Series(dates)).reindex(match_ids)
+    if days.isna().any():
+        missing = sorted(set(np.asarray(match_ids)[days.isna().to_numpy()].tolist()))
+        raise ValueError(f"No date for matches {missing}; form needs the date of every match it counts")
+    return days.to_numpy().astype('datetime64[D]').astype(np.int64)
+
+# Per-innings fantasy points of some player innings, ordered by match date (match id within a day) so
+# form sees them as they happened
+def scored_innings(innings, rules='t20', dates=None):
+    match_ids = innings['match_id'].to_numpy(dtype=np.int64)
+    days = match_days(match_ids, dates)
+    order = np.lexsort((match_ids, days))
+    innings = innings.iloc[order]
+    return pd.DataFrame({
+        'player': innings['player'].astype(str).to_numpy(),
+        'match_id': match_ids[order],
+        'day': days[order],
+        'points': score_table(innings, rules).to_numpy(),
+    })
+
+# Running form of every player, kept as sums that one new innings updates in O(1): the exponentially
+# decayed sum of points and of weights (their ratio is the EWMA) and a ring of the last N innings' points
+def build_form(innings, half_life=FORM_HALF_LIFE, window=FORM_WINDOW, rules='t20', dates=None):
+    scored = scored_innings(innings, rules, dates)
+    codes, players = pd.factorize(scored['player'])
+    players = pd.Index(players)
+    decay = 0.5 ** (1 / half_life)
+    counts = np.bincount(codes, minlength=len(players))
+    # Position of each innings in its player's history and how many innings came after it
+    position = scored.groupby(codes).cumcount().to_numpy()
+    age = counts[codes] - 1 - position
+    weights = (1 - decay) * decay ** age
+
+    recent = np.zeros((len(players), window))
+    latest = age < window
+    recent[codes[latest], position[latest] % window] = scored['points'].to_numpy()[latest]
+    last = age == 0
+    last_match = np.full(len(players), -1, dtype=np.int64)
+    last_match[codes[last]] = scored['match_id'].to_numpy()[last]
+    last_day = np.full(len(players), NO_DAY, dtype=np.int64)
+    last_day[codes[last]] = scored['day'].to_numpy()[last]
+    return {
+        'players': players,
+        'decay': decay,
+        'window': window,
+        'rules': rules,
+        'decayed_points': np.bincount(codes, weights * scored['points'].to_numpy(), minlength=len(players)),
+        'decayed_weight': np.bincount(codes, weights, minlength=len(players)),
+        'innings': counts.astype(np.int64),
+        'recent': recent,
+        'last_match': last_match,
+        'last_day': last_day,
+    }
+
+# Score new innings in time order and check that none is older than its player's latest counted match,
+# so a caller can reject a batch before writing any of it. A replay of the latest match is allowed.
+def check_form_order(form, innings, dates=None):
+    scored = scored_innings(innings, form['rules'], dates)
+    known = form['players'].get_indexer(scored['player'])
+    latest_match = np.where(known >= 0, form['last_match'][known], -1)
+    latest_day = np.where(known >= 0, form['last_day'][known], NO_DAY)
+    days, match_ids = scored['day'].to_numpy(), scored['match_id'].to_numpy()
+    out_of_order = (days < latest_day) | ((days == latest_day) & (match_ids < latest_match))
+    if out_of_order.any():
+        first = scored[out_of_order].iloc[0]
+        raise ValueError(f"Innings of {first['player']} in match {first['match_id']} is older than their latest counted match "
+                         f"{latest_match[out_of_order][0]}; form needs innings in time order")
+    return scored
+
+# Fold newly ingested innings into the form in place, one O(1) step per innings. A replay of a player's
+# latest match is skipped, so it never counts twice, but an innings older than the player's latest match
+# is rejected rather than silently dropped.
+def update_form(form, innings, dates=None):
+    scored = check_form_order(form, innings, dates)
+    new_players = pd.Index(scored['player'].unique())
+    new_players = new_players[~new_players.isin(form['players'])]
+    if len(new_players):
+        grow = len(new_players)
+        form['players'] = form['players'].append(new_players)
+        for name in ['decayed_points', 'decayed_weight', 'innings']:
+            form[name] = np.concatenate([form[name], np.zeros(grow, dtype=form[name].dtype)])
+        form['recent'] = np.vstack([form['recent'], np.zeros((grow, form['window']))])
+        form['last_match'] = np.concatenate([form['last_match'], np.full(grow, -1, dtype=np.int64)])
+        form['last_day'] = np.concatenate([form['last_day'], np.full(grow, NO_DAY, dtype=np.int64)])
+
+    decay, window = form['decay'], form['window']
+    for player_id, match_id, day, points in zip(form['players'].get_indexer(scored['player']), scored['match_id'],
+                                                scored['day'], scored['points']):
+        if match_id == form['last_match'][player_id]:
+            continue
+        form['decayed_points'][player_id] = decay * form['decayed_points'][player_id] + (1 - decay) * points
+        form['decayed_weight'][player_id] = decay * form['decayed_weight'][player_id] + (1 - decay)
+        form['recent'][player_id, form['innings'][player_id] % window] = points
+        form['innings'][player_id] += 1
+        form['last_match'][player_id] = match_id
+        form['last_day'][player_id] = day
+    return form
+
+# Form of the given players (default: everyone) as a table; players without innings have zero form
+def form_table(form, players=None):
+    innings = form['innings']
+    table = pd.DataFrame({
+        'innings': innings,
+        'ewma_points': np.divide(form['decayed_points'], form['decayed_weight'], out=np.zeros(len(innings)),
+                                 where=form['decayed_weight'] > 0),
+        'last_n_points': np.divide(form['recent'].sum(axis=1), np.minimum(innings, form['window']),
+                                   out=np.zeros(len(innings)), where=innings > 0),
+        'last_match': form['last_match'],
+    }, index=form['players'])[FORM_COLUMNS]
+    if players is None:
+        return table
+    return table.reindex(players).fillna({'innings': 0, 'ewma_points': 0.0, 'last_n_points': 0.0, 'last_match': -1}).astype(
+        {'innings': 'int64', 'last_match': 'int64'})
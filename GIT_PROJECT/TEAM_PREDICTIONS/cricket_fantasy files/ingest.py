@@ -0,0 +1,187 @@
+import argparse
+import os
+import joblib
+import pandas as pd
+from data_cache import append_cached, read_cached, source_signature
+from data_store import active_filters
+from form import build_form, check_form_order, update_form
+from match_transform import transform_matches
+from matchup_store import build_matchup_store, update_matchup_store
+from performance_index import build_performance_index, merge_performance_index
+
+MATCHES_FILE = 'IPL Mathces 2008-2023.csv'
+BYB_FILE = 'IPl Ball-by-Ball 2008-2023.csv'
+TRANSFORMED_FILE = 'transformed_match_data.csv'
+DERIVED_DIR = 'derived'
+# Ingest deltas loading may replay on top of the saved tables before it folds them into a new base
+DERIVED_DELTAS = 32
+
+# Location of the persisted derived tables
+def derived_path(derived_dir=DERIVED_DIR):
+    return os.path.join(derived_dir, 'derived_tables.joblib')
+
+# Numbered delta files each ingest leaves next to the derived tables, oldest first
+def delta_files(derived_dir=DERIVED_DIR):
+    if not os.path.isdir(derived_dir):
+        return []
+    deltas = [(int(name[len('delta_'):-len('.joblib')]), os.path.join(derived_dir, name)) for name in os.listdir(derived_dir)
+              if name.startswith('delta_') and name.endswith('.joblib') and name[len('delta_'):-len('.joblib')].isdigit()]
+    return sorted(deltas)
+
+# Date of every match by id, from the matches file and, for matches it does not list yet, the date column
+# of newly ingested ball-by-ball rows
+def match_dates(matches_file=MATCHES_FILE, new_byb=None):
+    matches = read_cached(matches_file, ['id', 'date'])
+    dates = pd.Series(pd.to_datetime(matches['date'].astype(str)).to_numpy(), index=matches['id'].astype(int).to_numpy())
+    if new_byb is not None and 'date' in new_byb.columns:
+        new_dates = new_byb.drop_duplicates('id')
+        new_dates = pd.Series(pd.to_datetime(new_dates['date'].astype(str)).to_numpy(), index=new_dates['id'].astype(int).to_numpy())
+        dates = pd.concat([dates, new_dates[~new_dates.index.isin(dates.index)]])
+    return dates[~dates.index.duplicated()]
+
+# The state of the source files the derived tables were built from
+def source_signatures(byb_file=BYB_FILE, transformed_file=TRANSFORMED_FILE, matches_file=MATCHES_FILE):
+    return {'byb': source_signature(byb_file), 'transformed': source_signature(transformed_file),
+            'matches': source_signature(matches_file)}
+
+# Rebuild every derived table from the full history; only needed once or after the sources change outside ingest.
+# Match ids are kept per source, so a match that reached only one of them (an ingest that stopped between
+# the two appends) is still completed by a replay. Form counts innings in match date order.
+def build_derived(byb_file=BYB_FILE, transformed_file=TRANSFORMED_FILE, matches_file=MATCHES_FILE):
+    byb = read_cached(byb_file)
+    transformed = read_cached(transformed_file)
+    return {
+        'match_ids': {'byb': set(byb['id'].astype(int)), 'transformed': set(transformed['match_id'].astype(int))},
+        'performance_index': build_performance_index(transformed),
+        'matchup_store': build_matchup_store(byb),
+        'form': build_form(transformed, dates=match_dates(matches_file)),
+        'sources': source_signatures(byb_file, transformed_file, matches_file),
+    }
+
+# The persisted derived tables if they reflect the current source files, otherwise None
+def fresh_derived(byb_file=BYB_FILE, transformed_file=TRANSFORMED_FILE, derived_dir=DERIVED_DIR, matches_file=MATCHES_FILE):
+    path = derived_path(derived_dir)
+    if not all(os.path.exists(file) for file in [path, byb_file, transformed_file, matches_file]):
+        return None
+    derived = joblib.load(path)
+    # Tables saved before match ids were kept per source are rebuilt as well
+    if not isinstance(derived['match_ids'], dict):
+        return None
+    for number, delta_file in delta_files(derived_dir):
+        if number > derived.get('applied_delta', 0):
+            apply_delta(derived, joblib.load(delta_file))
+            derived['applied_delta'] = number
+    # As are tables saved before form followed match dates, whose sources leave out the matches file
+    if derived['sources'] != source_signatures(byb_file, transformed_file, matches_file):
+        return None
+    return derived
+
+# Load the derived tables, rebuilding them if the source files were changed by anything other than ingest
+def load_derived(byb_file=BYB_FILE, transformed_file=TRANSFORMED_FILE, derived_dir=DERIVED_DIR, matches_file=MATCHES_FILE):
+    derived = fresh_derived(byb_file, transformed_file, derived_dir, matches_file)
+    if derived is not None:
+        if len(delta_files(derived_dir)) > DERIVED_DELTAS:
+            save_derived(derived, derived_dir)
+        return derived
+    derived = build_derived(byb_file, transformed_file, matches_file)
+    save_derived(derived, derived_dir)
+    return derived
+
+# Save the full tables as the new base. Every existing delta is either folded in already or predates a
+# rebuild, so the base records the last one as applied and they are removed; a delta left behind by an
+# interrupted save is skipped on load.
+def save_derived(derived, derived_dir=DERIVED_DIR):
+    os.makedirs(derived_dir, exist_ok=True)
+    deltas = delta_files(derived_dir)
+    if deltas:
+        derived['applied_delta'] = max(derived.get('applied_delta', 0), deltas[-1][0])
+    path = derived_path(derived_dir)
+    joblib.dump(derived, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    for _, delta_file in deltas:
+        os.remove(delta_file)
+
+# Fold one ingest's new rows into the derived tables in place
+def apply_delta(derived, delta):
+    derived['performance_index'] = merge_performance_index(derived['performance_index'], build_performance_index(delta['innings']))
+    update_matchup_store(derived['matchup_store'], delta['byb'])
+    update_form(derived['form'], delta['innings'], delta['dates'])
+    derived['match_ids']['byb'].update(delta['byb']['id'].astype(int))
+    derived['match_ids']['transformed'].update(delta['innings']['match_id'].astype(int))
+    derived['sources'] = delta['sources']
+    return derived
+
+# Persist one ingest as a new delta file instead of rewriting every table
+def save_delta(derived, delta, derived_dir=DERIVED_DIR):
+    os.makedirs(derived_dir, exist_ok=True)
+    deltas = delta_files(derived_dir)
+    number = max(derived.get('applied_delta', 0), deltas[-1][0] if deltas else 0) + 1
+    path = os.path.join(derived_dir, f'delta_{number:06d}.joblib')
+    joblib.dump(delta, path + '.tmp')
+    os.replace(path + '.tmp', path)
+    derived['applied_delta'] = number
+
+# Append rows to a CSV in the column order of its existing header
+def append_csv(csv_file, rows):
+    header = pd.read_csv(csv_file, nrows=0).columns
+    rows.reindex(columns=header).to_csv(csv_file, mode='a', header=False, index=False)
+
+# Performance index of the history scoring reads: the one ingest keeps up to date when it matches the
+# sources, otherwise one built from the data already loaded. Filtered data always gets its own index.
+def history_performance_index(data, transformed_file=TRANSFORMED_FILE, byb_file=BYB_FILE, derived_dir=DERIVED_DIR,
+                              matches_file=MATCHES_FILE, **filters):
+    derived = None if active_filters(filters) else fresh_derived(byb_file, transformed_file, derived_dir, matches_file)
+    if derived is None:
+        return build_performance_index(data)
+    return derived['performance_index']
+
+# Add finished matches to the sources and every derived table, writing only the new rows. Each source
+# only gets the matches it does not already hold, so replays never double-count, and a match that an
+# interrupted ingest wrote to only one source is completed by the next replay. New matches are dated from
+# the matches file or a date column of their rows, and the whole batch is checked against the form before
+# anything is written, so a match older than a player's latest counted one leaves every file untouched.
+def ingest_matches(new_byb, byb_file=BYB_FILE, transformed_file=TRANSFORMED_FILE, derived_dir=DERIVED_DIR,
+                   matches_file=MATCHES_FILE):
+    derived = load_derived(byb_file, transformed_file, derived_dir, matches_file)
+    known = derived['match_ids']
+    new_byb = new_byb[~new_byb['id'].astype(int).isin(known['byb'] & known['transformed'])]
+    if new_byb.empty:
+        return []
+
+    new_innings = transform_matches(new_byb)
+    new_innings = new_innings[~new_innings['match_id'].astype(int).isin(known['transformed'])]
+    new_byb_rows = new_byb[~new_byb['id'].astype(int).isin(known['byb'])]
+    dates = match_dates(matches_file, new_byb)
+    check_form_order(derived['form'], new_innings, dates)
+    if not new_byb_rows.empty:
+        append_csv(byb_file, new_byb_rows)
+        append_cached(byb_file, new_byb_rows, derived['sources']['byb'])
+    if not new_innings.empty:
+        append_csv(transformed_file, new_innings)
+        append_cached(transformed_file, new_innings, derived['sources']['transformed'])
+
+    delta = {
+        'byb': new_byb_rows.reset_index(drop=True),
+        'innings': new_innings.reset_index(drop=True),
+        'dates': dates[dates.index.isin(new_innings['match_id'].astype(int))],
+        'sources': source_signatures(byb_file, transformed_file, matches_file),
+    }
+    apply_delta(derived, delta)
+    save_delta(derived, delta, derived_dir)
+    return sorted(set(new_byb['id'].astype(int)))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Ingest the ball-by-ball rows of finished matches')
+    parser.add_argument('new_matches', help='CSV of ball-by-ball rows in the same format as the history file')
+    parser.add_argument('--matches', default=MATCHES_FILE)
+    parser.add_argument('--byb', default=BYB_FILE)
+    parser.add_argument('--transformed', default=TRANSFORMED_FILE)
+    parser.add_argument('--derived-dir', default=DERIVED_DIR)
+    args = parser.parse_args()
+
+    ingested = ingest_matches(pd.read_csv(args.new_matches), args.byb, args.transformed, args.derived_dir, args.matches)
+    if ingested:
+        print(f"Ingested matches: {', '.join(map(str, ingested))}")
+    else:
+        print("Nothing new to ingest")
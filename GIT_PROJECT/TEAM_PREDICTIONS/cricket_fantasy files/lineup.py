@@ -0,0 +1,145 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+ROLES = ['WK', 'BAT', 'AR', 'BOWL']
+
+# Team rules of the usual T20 fantasy contest: 11 players, (min, max) per role, a cap per real team,
+# a credit budget, and captain / vice-captain point multipliers
+LINEUP_RULES = {
+    'size': 11,
+    'roles': {'WK': (1, 4), 'BAT': (3, 6), 'AR': (1, 4), 'BOWL': (3, 6)},
+    'max_per_team': 7,
+    'credits': 100.0,
+    'captain': 2.0,
+    'vice_captain': 1.5,
+}
+
+# Credits used for players without a price, so the budget never binds for them alone
+DEFAULT_CREDITS = 8.5
+
+# Per-match averages that decide a player's role in infer_roles
+BOWLER_BALLS_PER_MATCH = 12
+ALLROUNDER_BALLS_FACED_PER_MATCH = 15
+ROLE_COLUMNS = ['player', 'ball_faced', 'ball_delivered', 'catch', 'stump']
+
+# Guess each player's role from their history: anyone with a stumping keeps wicket, regular bowlers
+# who also face enough balls are all-rounders, and everyone else bats. If none of the given players
+# has a stumping, the non-bowler with the most catches is taken as the keeper so a legal XI exists.
+def infer_roles(data, players=None):
+    per_match = data.groupby('player', observed=True).agg(
+        ball_faced=('ball_faced', 'mean'),
+        ball_delivered=('ball_delivered', 'mean'),
+        catches=('catch', 'sum'),
+        stumps=('stump', 'sum'),
+    )
+    roles = pd.Series(np.select(
+        [per_match['stumps'] > 0,
+         (per_match['ball_delivered'] >= BOWLER_BALLS_PER_MATCH) & (per_match['ball_faced'] >= ALLROUNDER_BALLS_FACED_PER_MATCH),
+         per_match['ball_delivered'] >= BOWLER_BALLS_PER_MATCH],
+        ['WK', 'AR', 'BOWL'], default='BAT'), index=per_match.index.astype(str))
+    if players is not None:
+        roles = roles.reindex(players, fill_value='BAT')
+        batters = roles[roles == 'BAT'].index
+        if not (roles == 'WK').any() and len(batters):
+            catches = per_match['catches'].reindex(batters, fill_value=0)
+            roles[catches.idxmax()] = 'WK'
+    return roles.to_dict()
+
+# Best-scoring legal XIs of a player pool, best first; pool needs player, team, role and score columns
+# and may have credits. Captain and vice-captain go to the two highest scorers of each lineup.
+def optimal_lineups(pool, k=1, rules=LINEUP_RULES):
+    pool = pool.sort_values('score', ascending=False, kind='stable').reset_index(drop=True)
+    if 'credits' not in pool:
+        pool = pool.assign(credits=DEFAULT_CREDITS)
+    size, budget, max_per_team = rules['size'], rules['credits'], rules['max_per_team']
+    n = len(pool)
+
+    scores = pool['score'].to_numpy(dtype=float).tolist()
+    credits = pool['credits'].to_numpy(dtype=float).tolist()
+    role_ids = pool['role'].map({role: i for i, role in enumerate(ROLES)}).to_numpy().tolist()
+    team_ids = pd.factorize(pool['team'])[0].tolist()
+    role_min = [rules['roles'][role][0] for role in ROLES]
+    role_max = [rules['roles'][role][1] for role in ROLES]
+
+    multipliers = [rules['captain'], rules['vice_captain']] + [1.0] * (size - 2)
+    # Players are in score order, so the next r players with the next r multipliers bound what the
+    # remaining picks can add from any position, whatever the constraints
+    bound = [[-np.inf] * (n + 1) for _ in range(size + 1)]
+    for picked in range(size + 1):
+        weights = multipliers[picked:]
+        for i in range(n - len(weights) + 1):
+            bound[picked][i] = sum(w * s for w, s in zip(weights, scores[i:i + len(weights)]))
+    # Players of each role and the cheapest credits still available from each position onwards
+    role_left = [[0] * len(ROLES) for _ in range(n + 1)]
+    cheapest_left = [np.inf] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        role_left[i] = list(role_left[i + 1])
+        role_left[i][role_ids[i]] += 1
+        cheapest_left[i] = min(cheapest_left[i + 1], credits[i])
+
+    best = []
+    picks = []
+    role_count = [0] * len(ROLES)
+    team_count = [0] * (max(team_ids) + 1 if team_ids else 0)
+
+    def search(i, points, spent):
+        picked = len(picks)
+        if picked == size:
+            if any(count < minimum for count, minimum in zip(role_count, role_min)):
+                return
+            entry = (points, picks.copy())
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            elif points > best[0][0]:
+                heapq.heapreplace(best, entry)
+            return
+        remaining = size - picked
+        if n - i < remaining or (len(best) == k and points + bound[picked][i] <= best[0][0]):
+            return
+        if spent + remaining * cheapest_left[i] > budget:
+            return
+        missing = 0
+        for r in range(len(ROLES)):
+            short = role_min[r] - role_count[r]
+            if short > 0:
+                if short > role_left[i][r]:
+                    return
+                missing += short
+        if missing > remaining:
+            return
+
+        role, team = role_ids[i], team_ids[i]
+        if role_count[role] < role_max[role] and team_count[team] < max_per_team and spent + credits[i] <= budget:
+            picks.append(i)
+            role_count[role] += 1
+            team_count[team] += 1
+            search(i + 1, points + multipliers[picked] * scores[i], spent + credits[i])
+            picks.pop()
+            role_count[role] -= 1
+            team_count[team] -= 1
+        search(i + 1, points, spent)
+
+    search(0, 0.0, 0.0)
+
+    lineups = []
+    for points, chosen in sorted(best, key=lambda entry: -entry[0]):
+        players = pool.loc[chosen, 'player'].tolist()
+        lineups.append({
+            'players': players,
+            'captain': players[0],
+            'vice_captain': players[1],
+            'points': points,
+            'credits': float(pool.loc[chosen, 'credits'].sum()),
+            'roles': pool.loc[chosen, 'role'].value_counts().reindex(ROLES, fill_value=0).to_dict(),
+        })
+    return lineups
+
+# One row per player per lineup, for writing a multi-entry contest to CSV
+def lineups_frame(lineups):
+    rows = []
+    for number, lineup in enumerate(lineups, start=1):
+        for player in lineup['players']:
+            tag = 'C' if player == lineup['captain'] else 'VC' if player == lineup['vice_captain'] else ''
+            rows.append((number, player, tag, lineup['points']))
+    return pd.DataFrame(rows, columns=['lineup', 'player', 'tag', 'lineup_points'])
@@ -0,0 +1,63 @@
+import argparse
+import csv
+import json
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# Read fixtures in the slate CSV format into request bodies for the service
+def load_request_bodies(fixtures_file):
+    with open(fixtures_file, newline='') as f:
+        return [
+            {
+                'team_a': row['team_a'],
+                'squad_a': [player_name.strip() for player_name in row['squad_a'].split(';')],
+                'team_b': row['team_b'],
+                'squad_b': [player_name.strip() for player_name in row['squad_b'].split(';')],
+            }
+            for row in csv.DictReader(f)
+        ]
+
+# Send one request and return its latency in seconds
+def timed_post(url, body):
+    payload = json.dumps(body).encode()
+    req = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    with urllib.request.urlopen(req) as response:
+        response.read()
+    return time.perf_counter() - start
+
+# Nearest-rank percentile of already sorted values
+def percentile(sorted_values, q):
+    index = min(len(sorted_values) - 1, max(0, int(round(q / 100 * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+# Fire a burst of requests from concurrent clients and summarise latency and throughput
+def run_load(url, bodies, total_requests, concurrency):
+    requests_to_send = [bodies[i % len(bodies)] for i in range(total_requests)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = sorted(pool.map(lambda body: timed_post(url, body), requests_to_send))
+    elapsed = time.perf_counter() - start
+    return {
+        'requests': total_requests,
+        'concurrency': concurrency,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'max_ms': latencies[-1] * 1000,
+        'requests_per_sec': total_requests / elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Burst load generator for the prediction service')
+    parser.add_argument('fixtures', help='fixtures CSV in the slate format')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/predict')
+    parser.add_argument('--requests', type=int, default=500)
+    parser.add_argument('--concurrency', type=int, default=32)
+    args = parser.parse_args()
+
+    report = run_load(args.url, load_request_bodies(args.fixtures), args.requests, args.concurrency)
+    print(f"{report['requests']} requests, {report['concurrency']} concurrent clients")
+    print(f"p50 {report['p50_ms']:.1f} ms  p99 {report['p99_ms']:.1f} ms  max {report['max_ms']:.1f} ms")
+    print(f"{report['requests_per_sec']:.1f} requests/sec")
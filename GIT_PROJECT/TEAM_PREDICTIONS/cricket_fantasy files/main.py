@@ -1,8 +1,221 @@
-from cricket_predictions import main
+import argparse
+import os
+import sys
+
+# Only the standard library is imported up front; every command imports what it needs, so quick commands
+# (a cached prediction) never load pandas or scikit-learn
+TRANSFORMED_FILE = 'transformed_match_data.csv'
+COMMANDS = ['ingest', 'store', 'train', 'tune', 'predict', 'form', 'slate', 'bench']
+
+# Add finished matches to the history and the derived tables
+def ingest_command(args):
+    import pandas as pd
+    from ingest import ingest_matches
+
+    ingested = ingest_matches(pd.read_csv(args.new_matches), args.byb, args.data, args.derived_dir, args.matches)
+    if ingested:
+        print(f"Ingested matches: {', '.join(map(str, ingested))}")
+    else:
+        print("Nothing new to ingest")
+
+# Model options shared by the commands that load or train models
+def model_options(args):
+    options = {'flatten': args.flatten}
+    if args.backend:
+        options['backend'] = args.backend
+    return options
+
+# League and season filters; when given, the history is read from the partitioned data store
+def data_filters(args):
+    return {'league': args.league, 'seasons': args.seasons}
+
+# Train (or load) the models for the current data and report their store key
+def train_command(args):
+    from cricket_predictions import DATA_COLUMNS, load_data, load_or_train_models
+    from data_store import data_source
+
+    data = load_data(args.data, DATA_COLUMNS, store_dir=args.store_dir, **data_filters(args))
+    source, scope = data_source(args.data, args.store_dir, **data_filters(args))
+    artifacts = load_or_train_models(source, data, scope=scope, **model_options(args))
+    print(f"Models {artifacts['key']} ({artifacts.get('backend', 'cluster_forest')}) ready")
+
+# Search the training parameters and keep the winner as the model store's tuned parameters
+def tune_command(args):
+    from tuning import tune
+
+    best, trials, share = tune(args.data, n_jobs=args.n_jobs)
+    trials.to_csv(args.output, index=False)
+    print(f"Tuned parameters: {best}")
+    print(f"{len(trials)} trials using {share:.0%} of the forest fitting of a full grid; trials written to {args.output}")
+
+# Print the best XI, or one player's predicted runs and wickets against a team
+def predict_command(args):
+    if args.player:
+        predict_player(args)
+        return
+
+    from cricket_predictions import main
+    from lineup import lineups_frame
+
+    lineups = main(args.lineups, cache_dir=args.cache_dir, store_dir=args.store_dir, **data_filters(args), **model_options(args))
+    if not lineups:
+        print("No XI satisfies the team rules")
+        return
+    best = lineups[0]
+    print(f"Best XI ({best['points']:.2f} points, {best['credits']} credits):")
+    for player_name in best['players']:
+        tag = ' (C)' if player_name == best['captain'] else ' (VC)' if player_name == best['vice_captain'] else ''
+        print(f"{player_name}{tag}")
+    if args.lineups > 1:
+        lineups_frame(lineups).to_csv(args.output, index=False)
+        print(f"{len(lineups)} lineups written to {args.output}")
+
+# Answer from the prediction cache when this data file and model options were seen before; only a miss
+# loads the data and models, and it links the cache so the next query is served without them
+def predict_player(args):
+    from model_store import tuned_params_path
+    from prediction_cache import PredictionCache, source_label
+
+    cache = PredictionCache(cache_dir=args.cache_dir)
+    filters = data_filters(args)
+    # The same store load_or_train_models reads its default parameters from
+    tuned_params_file = tuned_params_path()
+    # Filtered queries are read from the data store, so they are labelled by its catalog, which is rewritten
+    # whenever any partition changes
+    if any(value is not None for value in filters.values()):
+        label = source_label(os.path.join(args.store_dir, 'catalog.json'), tuned_params_file, **filters, **model_options(args))
+    else:
+        label = source_label(args.data, tuned_params_file, **model_options(args))
+    pair = (args.player, args.against)
+    namespace = cache.linked(label)
+    found = cache.get_many(namespace, [pair]) if namespace else {}
+    source = 'cached'
+    if pair not in found:
+        from cricket_predictions import DATA_COLUMNS, load_data, load_or_train_models, player_averages, predict_pairs
+        from data_store import data_source
+        from prediction_cache import data_version
+
+        data = load_data(args.data, DATA_COLUMNS, store_dir=args.store_dir, **filters)
+        source, scope = data_source(args.data, args.store_dir, **filters)
+        artifacts = load_or_train_models(source, data, scope=scope, **model_options(args))
+        averages = player_averages(data)
+        prediction = predict_pairs([pair], data, artifacts, averages, cache).iloc[0]
+        cache.link(label, (artifacts['key'], data_version(averages)))
+        found[pair] = (prediction['predicted_runs'], prediction['predicted_wickets'])
+        source = 'computed'
+
+    runs, wickets = found[pair]
+    if runs != runs:
+        print(f"No history for {args.player}")
+    else:
+        print(f"{args.player} vs {args.against}: {runs:.1f} runs, {wickets:.0f} wickets ({source})")
+
+# Recent form of the given players from the derived tables ingest keeps up to date
+def form_command(args):
+    from form import form_table
+    from ingest import load_derived
+
+    derived = load_derived(args.byb, args.data, args.derived_dir, args.matches)
+    print(form_table(derived['form'], args.players).round(2).to_string())
+
+# Score every fixture of a slate file
+def slate_command(args):
+    from slate import run_slate
+
+    results = run_slate(args.fixtures, args.output, args.data, cache_dir=args.cache_dir, store_dir=args.store_dir,
+                        **data_filters(args), **model_options(args))
+    print(f"Scored {results['fixture_id'].nunique()} fixtures, results written to {args.output}")
+
+# Hand the remaining arguments to the benchmark harness or the data store tool
+def bench_command(args):
+    import runpy
+
+    sys.argv = ['benchmark.py'] + args.passthrough_args
+    runpy.run_module('benchmark', run_name='__main__')
+
+def store_command(args):
+    import runpy
+
+    sys.argv = ['data_store.py'] + args.passthrough_args
+    runpy.run_module('data_store', run_name='__main__')
+
+def build_parser():
+    parser = argparse.ArgumentParser(description='Fantasy cricket predictions')
+    # A plain flag, so it can never take the command name as its value
+    parser.add_argument('--profile', action='store_true', help='time every pipeline stage and write a trace-event file')
+    parser.add_argument('--trace-file', default='profile_trace.json', help='where --profile writes its trace')
+    commands = parser.add_subparsers(dest='command', metavar='{' + ','.join(COMMANDS) + '}')
+
+    ingest = commands.add_parser('ingest', help='add the ball-by-ball rows of finished matches')
+    ingest.add_argument('new_matches', help='CSV of ball-by-ball rows in the same format as the history file')
+    ingest.add_argument('--matches', default='IPL Mathces 2008-2023.csv')
+    ingest.add_argument('--byb', default='IPl Ball-by-Ball 2008-2023.csv')
+    ingest.add_argument('--data', default=TRANSFORMED_FILE)
+    ingest.add_argument('--derived-dir', default='derived')
+    ingest.set_defaults(run=ingest_command)
+
+    train = commands.add_parser('train', help='train or load the models for the current data')
+    tune = commands.add_parser('tune', help='tune the model parameters with successive halving and train the winner')
+    tune.add_argument('--data', default=TRANSFORMED_FILE)
+    tune.add_argument('--n-jobs', type=int, default=-1, help='trials fitted in parallel')
+    tune.add_argument('--output', default='tuning_trials.csv')
+    tune.set_defaults(run=tune_command)
+    predict = commands.add_parser('predict', help='predict the best XI, or one player against a team')
+    predict.add_argument('--player', help='predict only this player (served from the cache when possible)')
+    predict.add_argument('--against', help='opponent of --player')
+    predict.add_argument('--lineups', type=int, default=1, metavar='K',
+                         help='generate the K best distinct legal XIs and write them to --output')
+    predict.add_argument('--output', default='lineups.csv')
+    form = commands.add_parser('form', help='show the recent form of players')
+    form.add_argument('players', nargs='+')
+    form.add_argument('--matches', default='IPL Mathces 2008-2023.csv')
+    form.add_argument('--byb', default='IPl Ball-by-Ball 2008-2023.csv')
+    form.add_argument('--data', default=TRANSFORMED_FILE)
+    form.add_argument('--derived-dir', default='derived')
+    form.set_defaults(run=form_command)
+    slate = commands.add_parser('slate', help='score a CSV of fixtures in one run')
+    slate.add_argument('fixtures', help='CSV of fixtures (team_a, squad_a, team_b, squad_b)')
+    slate.add_argument('--output', default='slate_predictions.csv')
+    for command, run in [(train, train_command), (predict, predict_command), (slate, slate_command)]:
+        command.add_argument('--data', default=TRANSFORMED_FILE)
+        command.add_argument('--backend', help='model family used for predictions (default: the library default)')
+        command.add_argument('--flatten', action='store_true', help='store and predict with forests flattened to node arrays')
+        command.add_argument('--cache-dir', default='prediction_cache', help='on-disk prediction cache')
+        command.add_argument('--league', help='use only this league, read from the partitioned data store')
+        command.add_argument('--seasons', type=int, nargs='+', help='use only these seasons of the data store')
+        command.add_argument('--store-dir', default='league_store', help='partitioned league/season data store')
+        command.set_defaults(run=run)
+
+    # Everything after 'bench' belongs to benchmark.py, including --help
+    bench = commands.add_parser('bench', help='run the benchmark harness (arguments are passed through)', add_help=False)
+    bench.set_defaults(run=bench_command)
+    store = commands.add_parser('store', help='build or list the partitioned data store (arguments are passed through)',
+                                add_help=False)
+    store.set_defaults(run=store_command)
+    return parser
 
 
 if __name__ == '__main__':
-    top_11_players = main()
-    print("Top 11 Players Based on Combined Scores:")
-    for player_name, score in top_11_players:
-        print(f"{player_name}: {score}")
+    parser = build_parser()
+    args, extra = parser.parse_known_args()
+    if args.command in ['bench', 'store']:
+        args.passthrough_args = extra
+    elif extra:
+        parser.error(f"unrecognized arguments: {' '.join(extra)}")
+    # Without a command, predict the best XI as before
+    if args.command is None:
+        args = parser.parse_args(['predict'], argparse.Namespace(profile=args.profile, trace_file=args.trace_file))
+    if args.command == 'predict' and bool(args.player) != bool(args.against):
+        parser.error('--player and --against go together')
+
+    if args.profile:
+        import profiling
+        profiling.enable()
+
+    args.run(args)
+
+    if args.profile:
+        profiling.write_trace(args.trace_file)
+        profiling.write_json(os.path.splitext(args.trace_file)[0] + '_summary.json')
+        print(profiling.format_summary())
+        print(f"Trace written to {args.trace_file} (open it in chrome://tracing, Perfetto or speedscope)")
@@ -0,0 +1,87 @@
+import pandas as pd
+
+# Column order of transformed_match_data.csv
+TRANSFORMED_COLUMNS = ['match_id', 'player', 'against_team', 'ball_faced', 'run_scored', 'ball_delivered', 'run_given',
+                       'wicket', '4s', '6s', '50s', '100s', 'catch', 'stump', 'run_out']
+
+# Dismissals that are not credited to the bowler
+NON_BOWLER_DISMISSALS = ['run out', 'retired hurt', 'retired out', 'obstructing the field']
+
+# Columns of the per-innings stats table, a superset of the transformed columns that the scoring engine reads
+INNINGS_COLUMNS = TRANSFORMED_COLUMNS + ['dismissed', '30s', 'maidens', 'lbw', 'bowled', 'lbw_bowled', '3w', '4w', '5w']
+
+# One row per player per match with batting, bowling and fielding totals and milestone flags,
+# built with one groupby per role instead of a filter per player and match
+def innings_stats(byb):
+    byb = byb.assign(
+        legal_for_batsman=(byb['extras_type'] != 'wides').astype(int),
+        legal_for_bowler=(~byb['extras_type'].isin(['wides', 'noballs'])).astype(int),
+        conceded=byb['batsman_runs'] + byb['extra_runs'].where(byb['extras_type'].isin(['wides', 'noballs']), 0),
+        is_4=(byb['batsman_runs'] == 4).astype(int),
+        is_6=(byb['batsman_runs'] == 6).astype(int),
+        bowler_wicket=(byb['is_wicket'].astype(bool) & ~byb['dismissal_kind'].isin(NON_BOWLER_DISMISSALS)).astype(int),
+        is_lbw=(byb['dismissal_kind'] == 'lbw').astype(int),
+        is_bowled=(byb['dismissal_kind'] == 'bowled').astype(int),
+        is_catch=byb['dismissal_kind'].isin(['caught', 'caught and bowled']).astype(int),
+        is_stump=(byb['dismissal_kind'] == 'stumped').astype(int),
+        is_run_out=(byb['dismissal_kind'] == 'run out').astype(int),
+    )
+
+    batting = byb.groupby(['id', 'batsman', 'bowling_team'], observed=True).agg(
+        ball_faced=('legal_for_batsman', 'sum'),
+        run_scored=('batsman_runs', 'sum'),
+        **{'4s': ('is_4', 'sum'), '6s': ('is_6', 'sum')},
+    )
+    batting.index.names = ['match_id', 'player', 'against_team']
+    # The dismissed player may be the non-striker; only innings that faced a ball get a row
+    dismissed = byb[byb['is_wicket'].astype(bool)].groupby(['id', 'player_dismissed', 'bowling_team'], observed=True).size()
+    dismissed.index.names = ['match_id', 'player', 'against_team']
+    batting['dismissed'] = dismissed.reindex(batting.index, fill_value=0)
+
+    bowling = byb.groupby(['id', 'bowler', 'batting_team'], observed=True).agg(
+        ball_delivered=('legal_for_bowler', 'sum'),
+        run_given=('conceded', 'sum'),
+        wicket=('bowler_wicket', 'sum'),
+        lbw=('is_lbw', 'sum'),
+        bowled=('is_bowled', 'sum'),
+    )
+    bowling.index.names = ['match_id', 'player', 'against_team']
+    overs = byb.groupby(['id', 'bowler', 'batting_team', 'inning', 'over'], observed=True).agg(
+        conceded=('conceded', 'sum'), legal=('legal_for_bowler', 'sum'))
+    maidens = ((overs['conceded'] == 0) & (overs['legal'] >= 6)).groupby(level=[0, 1, 2], observed=True).sum()
+    maidens.index.names = ['match_id', 'player', 'against_team']
+    bowling['maidens'] = maidens.reindex(bowling.index, fill_value=0)
+
+    dismissals = byb[byb['fielder'].notna() & byb['is_wicket'].astype(bool)]
+    fielding = dismissals.groupby(['id', 'fielder', 'batting_team'], observed=True).agg(
+        catch=('is_catch', 'sum'),
+        stump=('is_stump', 'sum'),
+        run_out=('is_run_out', 'sum'),
+    )
+    fielding.index.names = ['match_id', 'player', 'against_team']
+
+    # Sorted by match and player so the rows do not depend on how the ball-by-ball rows were batched
+    innings = pd.concat([batting, bowling, fielding], axis=1).fillna(0).astype(int).sort_index().reset_index()
+    innings['30s'] = ((innings['run_scored'] >= 30) & (innings['run_scored'] < 50)).astype(int)
+    innings['50s'] = ((innings['run_scored'] >= 50) & (innings['run_scored'] < 100)).astype(int)
+    innings['100s'] = (innings['run_scored'] >= 100).astype(int)
+    innings['lbw_bowled'] = innings['lbw'] + innings['bowled']
+    innings['3w'] = (innings['wicket'] == 3).astype(int)
+    innings['4w'] = (innings['wicket'] == 4).astype(int)
+    innings['5w'] = (innings['wicket'] >= 5).astype(int)
+    innings['match_id'] = innings['match_id'].astype('int64')
+    innings['player'] = innings['player'].astype(str)
+    innings['against_team'] = innings['against_team'].astype(str)
+    return innings[INNINGS_COLUMNS]
+
+# Per-match rates of every milestone and fielding event for each player, so a player's rates are a lookup
+def milestone_rates(innings):
+    totals = innings.groupby('player', observed=True)[['30s', '50s', '100s', '3w', '4w', '5w', 'catch', 'stump', 'run_out', 'lbw', 'bowled']].sum()
+    matches = innings.groupby('player', observed=True)['match_id'].nunique()
+    rates = totals.div(matches, axis=0)
+    rates.insert(0, 'matches', matches)
+    return rates
+
+# Turn ball-by-ball rows of complete matches into one row per player per match
+def transform_matches(byb):
+    return innings_stats(byb)[TRANSFORMED_COLUMNS]
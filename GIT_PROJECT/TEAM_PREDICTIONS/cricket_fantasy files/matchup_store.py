@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+MATCHUP_STATS = ['balls', 'runs', '4s', '6s', 'dismissals']
+
+# Count batsman-vs-bowler stats of some ball-by-ball rows into sparse matrices over a fixed player index
+def count_matchups(byb, players):
+    batsman_ids = players.get_indexer(byb['batsman'])
+    bowler_ids = players.get_indexer(byb['bowler'])
+    runs = byb['batsman_runs'].to_numpy()
+    values = {
+        'balls': np.ones(len(byb)),
+        'runs': runs,
+        '4s': runs == 4,
+        '6s': runs == 6,
+        'dismissals': byb['is_wicket'].to_numpy(),
+    }
+
+    shape = (len(players), len(players))
+    matrices = {}
+    for stat in MATCHUP_STATS:
+        counts = np.asarray(values[stat], dtype=np.int32)
+        # Duplicate (batsman, bowler) entries are summed when converting to CSR
+        matrices[stat] = sparse.coo_matrix((counts, (batsman_ids, bowler_ids)), shape=shape).tocsr()
+    return matrices
+
+# Every player name appearing as batsman or bowler, in order of first appearance
+def matchup_players(byb):
+    return pd.Index(pd.unique(np.concatenate([np.asarray(byb['batsman'].unique()), np.asarray(byb['bowler'].unique())])))
+
+# Build batsman-vs-bowler totals from the ball-by-ball frame in one pass, keyed by integer player ids
+def build_matchup_store(byb):
+    players = matchup_players(byb)
+    return {'players': players, 'matrices': count_matchups(byb, players)}
+
+# Add newly ingested ball-by-ball rows to a store in place; unseen players get the next free ids
+def update_matchup_store(store, byb):
+    new_players = matchup_players(byb)
+    players = store['players'].append(new_players[~new_players.isin(store['players'])])
+    additions = count_matchups(byb, players)
+    for stat in MATCHUP_STATS:
+        matrix = store['matrices'][stat]
+        matrix.resize((len(players), len(players)))
+        store['matrices'][stat] = matrix + additions[stat]
+    store['players'] = players
+    return store
+
+# Gather the batsmen x bowlers block of every stat in one vectorized indexing step per stat
+def matchup_block(store, batsmen, bowlers):
+    batsman_ids = store['players'].get_indexer(batsmen)
+    bowler_ids = store['players'].get_indexer(bowlers)
+    known_batsmen = batsman_ids >= 0
+    known_bowlers = bowler_ids >= 0
+
+    blocks = {}
+    for stat, matrix in store['matrices'].items():
+        block = np.zeros((len(batsmen), len(bowlers)), dtype=np.int32)
+        gathered = matrix[batsman_ids[known_batsmen]][:, bowler_ids[known_bowlers]]
+        block[np.ix_(known_batsmen, known_bowlers)] = gathered.toarray()
+        blocks[stat] = block
+    return blocks
+
+# Head-to-head fantasy points of every player in team1 against the whole of team2
+def head_to_head_points(store, team1, team2, four_points=1, six_points=2, wicket_points=25):
+    batting = matchup_block(store, team1, team2)
+    bowling = matchup_block(store, team2, team1)
+    balls = batting['balls']
+    dismissals = batting['dismissals']
+
+    # Penalise batsmen who are dismissed repeatedly by a bowler in few balls
+    penalty = np.select(
+        [(balls <= 60) & (dismissals >= 5), (balls <= 48) & (dismissals >= 4), (balls <= 36) & (dismissals >= 3)],
+        [-16, -8, -4],
+        default=0,
+    )
+    points = (batting['runs'] + batting['4s'] * four_points + batting['6s'] * six_points
+              - dismissals * wicket_points + bowling['dismissals'].T * wicket_points + penalty)
+    return pd.Series(points.sum(axis=1), index=team1)
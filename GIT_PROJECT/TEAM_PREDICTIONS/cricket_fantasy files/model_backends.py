@@ -0,0 +1,166 @@
+import pickle
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.cluster import KMeans
+from sklearn.ensemble import (HistGradientBoostingClassifier, HistGradientBoostingRegressor,
+                              RandomForestClassifier, RandomForestRegressor)
+from profiling import count, stage
+
+# Numeric inputs of the runs and wickets models; the opponent is added by each backend in its own form
+RUNS_INPUTS = ['ball_faced']
+WICKETS_INPUTS = ['ball_delivered', 'run_given']
+# Histogram gradient boosting accepts categorical features with at most this many categories
+HIST_GB_MAX_CATEGORIES = 255
+
+# Integer code of each row's opponent in the fitted encoder's category order
+def opponent_codes(rows, encoder):
+    return pd.Categorical(rows['against_team'], categories=encoder.categories_[0]).codes
+
+# Code the histogram models see for each encoder category. Up to HIST_GB_MAX_CATEGORIES opponents each keep
+# their own code; beyond that (several leagues in one history) the most frequent opponents keep theirs and
+# the rarest share the last code, so the feature stays within what the models accept.
+def opponent_buckets(codes, n_categories, max_categories=HIST_GB_MAX_CATEGORIES):
+    if n_categories <= max_categories:
+        return np.arange(n_categories)
+    counts = np.bincount(codes[codes >= 0], minlength=n_categories)
+    kept = np.argsort(-counts, kind='stable')[:max_categories - 1]
+    buckets = np.full(n_categories, max_categories - 1)
+    buckets[kept] = np.arange(max_categories - 1)
+    return buckets
+
+# Opponent codes mapped to their buckets; opponents the encoder never saw stay negative, which the models treat as missing
+def bucketed_codes(codes, buckets):
+    if buckets is None:
+        return codes
+    return np.where(codes >= 0, buckets[np.maximum(codes, 0)], -1)
+
+# Histogram gradient boosting: one global model per target, with the opponent as a native categorical feature
+# instead of one-hot columns, so the model stays small however many opponents there are
+def fit_hist_gb(data, against_team_encoded, encoder, params, n_jobs):
+    raw_codes = opponent_codes(data, encoder)
+    buckets = opponent_buckets(raw_codes, len(encoder.categories_[0]))
+    codes = bucketed_codes(raw_codes, buckets)
+    if codes.max(initial=-1) >= HIST_GB_MAX_CATEGORIES:
+        raise ValueError(f"Opponent codes must stay below {HIST_GB_MAX_CATEGORIES}, got {codes.max()}")
+    models = {'opponent_buckets': buckets}
+    with stage('hist_gb_fit', rows_in=2 * len(data)):
+        for name, inputs, target, model_class in [('runs', RUNS_INPUTS, 'run_scored', HistGradientBoostingRegressor),
+                                                  ('wickets', WICKETS_INPUTS, 'wicket', HistGradientBoostingClassifier)]:
+            features = np.column_stack([data[inputs].to_numpy(dtype=float), codes])
+            model = model_class(max_iter=params['n_estimators'], random_state=params['random_state'],
+                                categorical_features=[len(inputs)])
+            models[f'model_{name}'] = model.fit(features, data[target].to_numpy(dtype=int))
+        count('sklearn.fit', 2)
+    return models
+
+def predict_hist_gb(models, rows, against_team_encoded, encoding):
+    codes = bucketed_codes(opponent_codes(rows, models['encoder']), models.get('opponent_buckets'))
+    with stage('hist_gb_predict', rows_in=2 * len(rows)):
+        runs = models['model_runs'].predict(np.column_stack([rows[RUNS_INPUTS].to_numpy(dtype=float), codes]))
+        wickets = models['model_wickets'].predict(np.column_stack([rows[WICKETS_INPUTS].to_numpy(dtype=float), codes]))
+        count('sklearn.predict', 2)
+    return runs, wickets
+
+# Numeric inputs, sparse one-hot opponent and the KMeans cluster id as one CSR feature matrix
+def global_features(rows, inputs, against_team_encoded, kmeans=None):
+    encoded = against_team_encoded if sparse.issparse(against_team_encoded) else sparse.csr_matrix(np.asarray(against_team_encoded))
+    features = sparse.hstack([sparse.csr_matrix(rows[inputs].to_numpy(dtype=float)), encoded], format='csr')
+    if kmeans is None:
+        return features
+    clusters = kmeans.predict(features)
+    return sparse.hstack([features, sparse.csr_matrix(clusters.reshape(-1, 1).astype(float))], format='csr')
+
+# A single forest per target over all rows, with the opponent and the KMeans cluster as features,
+# in place of one forest per cluster
+def fit_global_forest(data, against_team_encoded, encoder, params, n_jobs):
+    models = {}
+    with stage('global_forest_fit', rows_in=2 * len(data)):
+        for name, inputs, target, model_class in [('runs', RUNS_INPUTS, 'run_scored', RandomForestRegressor),
+                                                  ('wickets', WICKETS_INPUTS, 'wicket', RandomForestClassifier)]:
+            kmeans = KMeans(n_clusters=params['n_clusters'], random_state=params['random_state'])
+            kmeans.fit(global_features(data, inputs, against_team_encoded))
+            model = model_class(n_estimators=params['n_estimators'], max_depth=params.get('max_depth'),
+                                min_samples_leaf=params.get('min_samples_leaf', 1), random_state=params['random_state'], n_jobs=n_jobs)
+            models[f'kmeans_{name}'] = kmeans
+            models[f'model_{name}'] = model.fit(global_features(data, inputs, against_team_encoded, kmeans),
+                                                data[target].to_numpy(dtype=int))
+        count('sklearn.fit', 4)
+    return models
+
+def predict_global_forest(models, rows, against_team_encoded, encoding):
+    with stage('global_forest_predict', rows_in=2 * len(rows)):
+        runs = models['model_runs'].predict(global_features(rows, RUNS_INPUTS, against_team_encoded, models['kmeans_runs']))
+        wickets = models['model_wickets'].predict(global_features(rows, WICKETS_INPUTS, against_team_encoded, models['kmeans_wickets']))
+        count('sklearn.predict', 4)
+    return runs, wickets
+
+# A fitted random forest flattened into contiguous node arrays, evaluated for all rows and trees at once;
+# drop-in for the forest's predict, with no per-tree Python or estimator objects to load
+class FlatForest:
+    def __init__(self, forest):
+        trees = [estimator.tree_ for estimator in forest.estimators_]
+        offsets = np.cumsum([0] + [tree.node_count for tree in trees[:-1]])
+        # Node indices fit in 32 bits for any forest this project trains, halving the size of the index arrays
+        self.roots = offsets.astype(np.int32)
+        left = np.concatenate([tree.children_left for tree in trees])
+        right = np.concatenate([tree.children_right for tree in trees])
+        shift = np.repeat(offsets, [tree.node_count for tree in trees])
+        self.left = np.where(left >= 0, left + shift, -1).astype(np.int32)
+        self.right = np.where(right >= 0, right + shift, -1).astype(np.int32)
+        # Leaves get feature 0 so gathering their (unused) input never indexes out of range
+        self.feature = np.where(left >= 0, np.concatenate([tree.feature for tree in trees]), 0).astype(np.int32)
+        self.threshold = np.concatenate([tree.threshold for tree in trees])
+        self.max_depth = max(tree.max_depth for tree in trees)
+
+        values = np.concatenate([tree.value[:, 0, :] for tree in trees])
+        self.classes = getattr(forest, 'classes_', None)
+        if self.classes is None:
+            self.value = values[:, 0]
+        else:
+            totals = values.sum(axis=1, keepdims=True)
+            self.value = values / np.where(totals == 0, 1, totals)
+
+    # Leaf node of every row in every tree, found by stepping all of them down one level at a time
+    def leaves(self, X):
+        X = X.toarray() if sparse.issparse(X) else np.asarray(X)
+        X = X.astype(np.float32)
+        nodes = np.tile(self.roots, (X.shape[0], 1))
+        rows = np.arange(X.shape[0])[:, None]
+        for _ in range(self.max_depth):
+            left = self.left[nodes]
+            internal = left >= 0
+            if not internal.any():
+                break
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(internal, np.where(go_left, left, self.right[nodes]), nodes)
+        return nodes
+
+    # Same result as the forest's predict: the mean over trees, accumulated tree by tree as sklearn does
+    def predict(self, X):
+        leaves = self.leaves(X)
+        total = np.zeros((leaves.shape[0],) + self.value.shape[1:])
+        for tree in range(leaves.shape[1]):
+            total += self.value[leaves[:, tree]]
+        total /= leaves.shape[1]
+        if self.classes is None:
+            return total
+        return self.classes.take(np.argmax(total, axis=1))
+
+    @property
+    def nbytes(self):
+        return sum(array.nbytes for array in (self.roots, self.left, self.right, self.feature, self.threshold, self.value))
+
+# Replace every random forest in a model set, including the per-cluster dicts, by its flattened form
+def flatten_models(models):
+    def flat(model):
+        if isinstance(model, dict):
+            return {key: flat(value) for key, value in model.items()}
+        if isinstance(model, (RandomForestRegressor, RandomForestClassifier)):
+            return FlatForest(model)
+        return model
+    return {key: flat(value) for key, value in models.items()}
+
+# Pickled size of a model set in bytes, i.e. what the model store writes and loads
+def model_size(models):
+    return len(pickle.dumps(models, protocol=pickle.HIGHEST_PROTOCOL))
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import os
+
+MODEL_STORE_DIR = 'model_store'
+# joblib is imported only where artifacts are read or written, so the cached CLI path can read the
+# tuned parameters without it
+
+# Hash the raw bytes of a data file so any change to it produces a new fingerprint
+def file_fingerprint(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Build the store key from the training data fingerprint and the training parameters; the data is one file
+# or, for data read from the partitioned data store, the list of partition files it came from
+def store_key(transformed_file, params):
+    if isinstance(transformed_file, str):
+        data = file_fingerprint(transformed_file)
+    else:
+        data = [file_fingerprint(path) for path in transformed_file]
+    payload = json.dumps({'data': data, 'params': params}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+# Location of the artifact file for a given key
+def artifact_path(key, store_dir=MODEL_STORE_DIR):
+    return os.path.join(store_dir, f'models_{key}.joblib')
+
+# Save fitted artifacts uncompressed so their arrays can be memory-mapped on load
+def save_artifacts(artifacts, key, store_dir=MODEL_STORE_DIR):
+    os.makedirs(store_dir, exist_ok=True)
+    path = artifact_path(key, store_dir)
+    tmp_path = path + '.tmp'
+    import joblib
+    joblib.dump(artifacts, tmp_path)
+    os.replace(tmp_path, path)
+    return path
+
+# Training parameters picked by tuning.py, kept next to the models so later training uses them by default
+def tuned_params_path(store_dir=MODEL_STORE_DIR):
+    return os.path.join(store_dir, 'tuned_params.json')
+
+def save_tuned_params(params, store_dir=MODEL_STORE_DIR, **details):
+    os.makedirs(store_dir, exist_ok=True)
+    path = tuned_params_path(store_dir)
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'params': params, **details}, f, indent=2)
+    os.replace(path + '.tmp', path)
+    return path
+
+# Tuned training parameters of a store, or None if it was never tuned
+def load_tuned_params(store_dir=MODEL_STORE_DIR):
+    path = tuned_params_path(store_dir)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)['params']
+
+# Load the artifacts stored under a key, or None if nothing has been trained for it yet
+def load_artifacts(key, store_dir=MODEL_STORE_DIR):
+    path = artifact_path(key, store_dir)
+    if not os.path.exists(path):
+        return None
+    import joblib
+    return joblib.load(path, mmap_mode='r')
@@ -0,0 +1,39 @@
+import pandas as pd
+from profiling import profiled
+
+INDEX_KEYS = ['player', 'against_team']
+PERFORMANCE_COLUMNS = ['matches_played', 'total_runs', 'total_wickets', 'total_4s', 'total_6s', 'total_50s', 'total_100s']
+
+# Aggregate every (player, against_team) pair once so lookups never rescan the history table
+@profiled()
+def build_performance_index(df):
+    stats = df.assign(
+        is_50=(df['run_scored'] >= 50).astype(int),
+        is_100=(df['run_scored'] >= 100).astype(int),
+    )
+    index = stats.groupby(INDEX_KEYS, observed=True).agg(
+        matches_played=('match_id', 'nunique'),
+        total_runs=('run_scored', 'sum'),
+        total_wickets=('wicket', 'sum'),
+        total_4s=('4s', 'sum'),
+        total_6s=('6s', 'sum'),
+        total_50s=('is_50', 'sum'),
+        total_100s=('is_100', 'sum'),
+    )
+    return index[PERFORMANCE_COLUMNS]
+
+# Fold the index of newly ingested matches into an existing index; the two must not share match ids
+def merge_performance_index(index, new_index):
+    return index.add(new_index, fill_value=0).astype('int64')[PERFORMANCE_COLUMNS]
+
+# Look up one player's aggregate record against a team; unseen pairs score zero everywhere
+def performance_lookup(index, player_name, team_name):
+    key = (player_name, team_name)
+    if key not in index.index:
+        return {column: 0 for column in PERFORMANCE_COLUMNS}
+    return index.loc[key].to_dict()
+
+# Look up many (player, against_team) pairs at once, returned in the order given
+def bulk_performance_lookup(index, pairs):
+    keys = pd.MultiIndex.from_tuples(list(pairs), names=INDEX_KEYS)
+    return index.reindex(keys, fill_value=0)
@@ -0,0 +1,178 @@
+import hashlib
+import json
+import os
+import pickle
+import time
+from collections import OrderedDict
+
+PREDICTION_CACHE_DIR = 'prediction_cache'
+PREDICTION_CACHE_SIZE = 100000
+# Namespaces whose persisted predictions are kept loaded in a process
+PREDICTION_CACHE_NAMESPACES = 4
+# Shard files a namespace may collect before loading it merges them into one
+PREDICTION_CACHE_SHARDS = 64
+
+# Fingerprint of the per-player averages the models predict from; ingesting matches changes it,
+# so predictions made from older averages are never served again
+def data_version(averages):
+    import pandas as pd
+    hashed = pd.util.hash_pandas_object(averages, index=True).to_numpy()
+    return hashlib.sha256(hashed.tobytes()).hexdigest()[:16]
+
+# Label of one state of a data file and the options models are trained with, from a stat call alone,
+# so a process can find its cached predictions before loading any data or models. Tuned parameters
+# change which models load by default, so the label also covers the tuned parameters file if there is one.
+def source_label(transformed_file, tuned_params_file=None, **options):
+    stat = os.stat(transformed_file)
+    tuned = None
+    if tuned_params_file is not None and os.path.exists(tuned_params_file):
+        with open(tuned_params_file) as f:
+            tuned = json.load(f)['params']
+    payload = json.dumps({'source': os.path.abspath(transformed_file), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+                          'tuned_params': tuned, **options}, sort_keys=True)
+    return hashlib.sha256(payload.encode()).hexdigest()[:16]
+
+# Predicted (runs, wickets) per (player, against_team), held in a bounded in-process LRU and optionally
+# persisted per (model key, data version) so later processes start warm. Retraining changes the model key
+# and ingesting changes the data version, so stale entries are simply never looked up again. Each put_many
+# writes only its own predictions as a new shard file of the namespace, so persisting stays proportional to
+# the new predictions; the loaded namespaces are bounded like the LRU.
+class PredictionCache:
+    def __init__(self, max_entries=PREDICTION_CACHE_SIZE, cache_dir=None, max_namespaces=PREDICTION_CACHE_NAMESPACES):
+        self.max_entries = max_entries
+        self.max_namespaces = max_namespaces
+        self.cache_dir = cache_dir
+        self.entries = OrderedDict()
+        self.stored = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    # Directory holding the persisted prediction shards of one model and data version
+    def namespace_path(self, namespace):
+        return os.path.join(self.cache_dir, 'predictions_{}_{}'.format(*namespace))
+
+    # Shard files of a namespace, oldest first
+    def shard_files(self, namespace):
+        path = self.namespace_path(namespace)
+        if not os.path.isdir(path):
+            return []
+        return [os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith('.pkl')]
+
+    # Write some predictions as a new shard; names start with the time so shards sort oldest first,
+    # and carry the process id so concurrent writers never collide
+    def write_shard(self, namespace, predictions):
+        path = self.namespace_path(namespace)
+        os.makedirs(path, exist_ok=True)
+        shard = os.path.join(path, f'{time.time_ns():020d}_{os.getpid()}.pkl')
+        with open(shard + '.tmp', 'wb') as f:
+            pickle.dump(predictions, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(shard + '.tmp', shard)
+
+    # Persisted predictions of a namespace, merged from its shards the first time it is used. A namespace
+    # with many shards is compacted into one, so later loads open few files.
+    def load_namespace(self, namespace):
+        if namespace in self.stored:
+            self.stored.move_to_end(namespace)
+            return self.stored[namespace]
+        stored = {}
+        shards = self.shard_files(namespace) if self.cache_dir else []
+        merged = []
+        for shard in shards:
+            try:
+                with open(shard, 'rb') as f:
+                    stored.update(pickle.load(f))
+                merged.append(shard)
+            except FileNotFoundError:
+                # Another process compacted it away; its predictions are in the newer shard it wrote
+                continue
+        if len(merged) > PREDICTION_CACHE_SHARDS:
+            self.write_shard(namespace, stored)
+            for shard in merged:
+                try:
+                    os.remove(shard)
+                except FileNotFoundError:
+                    continue
+        self.stored[namespace] = stored
+        self.evict_namespaces()
+        return stored
+
+    # Drop the least recently used loaded namespaces beyond max_namespaces or max_entries, always keeping the latest
+    def evict_namespaces(self):
+        while len(self.stored) > 1 and (len(self.stored) > self.max_namespaces
+                                        or sum(len(stored) for stored in self.stored.values()) > self.max_entries):
+            self.stored.popitem(last=False)
+
+    # Cached predictions for the given pairs, as a dict of the pairs found; the rest count as misses
+    def get_many(self, namespace, pairs):
+        stored = self.load_namespace(namespace)
+        found = {}
+        for pair in pairs:
+            key = namespace + pair
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                found[pair] = self.entries[key]
+                self.hits += 1
+            elif pair in stored:
+                found[pair] = stored[pair]
+                self.remember(key, stored[pair])
+                self.disk_hits += 1
+            else:
+                self.misses += 1
+        return found
+
+    # Add freshly computed predictions to memory and, with a cache_dir, persist them as a new shard
+    def put_many(self, namespace, predictions):
+        if not predictions:
+            return
+        for pair, value in predictions.items():
+            self.remember(namespace + pair, value)
+        if namespace in self.stored:
+            self.stored.move_to_end(namespace)
+            self.stored[namespace].update(predictions)
+            self.evict_namespaces()
+        if self.cache_dir:
+            self.write_shard(namespace, predictions)
+
+    def remember(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    # Record which namespace a source label resolved to, once a process has loaded the data and models
+    def link(self, label, namespace):
+        links = self.links()
+        links[label] = list(namespace)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = os.path.join(self.cache_dir, 'links.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(links, f)
+        os.replace(path + '.tmp', path)
+
+    # Namespace last linked to a source label, or None
+    def linked(self, label):
+        namespace = self.links().get(label)
+        return tuple(namespace) if namespace else None
+
+    def links(self):
+        path = os.path.join(self.cache_dir, 'links.json')
+        if not os.path.exists(path):
+            return {}
+        with open(path) as f:
+            return json.load(f)
+
+    # Drop the in-process entries; persisted files are left for other processes
+    def clear(self):
+        self.entries.clear()
+        self.stored.clear()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+        }
@@ -0,0 +1,158 @@
+import functools
+import json
+import os
+import sys
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+# Profiling is off unless enable() is called; every hook checks this flag first and returns immediately
+_enabled = False
+_events = []
+_counters = {}
+_origin_ns = 0
+_local = threading.local()
+
+def enable():
+    global _enabled, _origin_ns
+    _events.clear()
+    _counters.clear()
+    _origin_ns = time.perf_counter_ns()
+    _enabled = True
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled():
+    return _enabled
+
+# High-water mark of the process resident set size in MB
+def peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10, 2)
+
+# Resident set size of the process right now in MB, or None where /proc is not available
+def current_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(pages * os.sysconf('SC_PAGE_SIZE') / 2 ** 20, 2)
+
+# Count calls of something that is not worth a stage of its own, such as sklearn fit/predict calls
+def count(name, n=1):
+    if _enabled:
+        _counters[name] = _counters.get(name, 0) + n
+
+# Number of rows in a frame/array argument or result, if it has any
+def row_count(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    shape = getattr(value, 'shape', None)
+    return shape[0] if shape else None
+
+# Time a block of the pipeline: with stage('train_models', rows_in=len(data)) as s: ...; s.rows_out = n
+class stage:
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        if _enabled:
+            self.depth = getattr(_local, 'depth', 0)
+            _local.depth = self.depth + 1
+            self.start_ns = time.perf_counter_ns()
+            self.start_cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        if _enabled and hasattr(self, 'start_ns'):
+            end_ns = time.perf_counter_ns()
+            _local.depth = self.depth
+            _events.append({
+                'name': self.name,
+                'start_us': (self.start_ns - _origin_ns) / 1000,
+                'wall_ms': (end_ns - self.start_ns) / 1e6,
+                'cpu_ms': (time.process_time() - self.start_cpu) * 1000,
+                'peak_rss_mb': peak_rss_mb(),
+                'rows_in': self.rows_in,
+                'rows_out': self.rows_out,
+                'depth': self.depth,
+                'thread': threading.get_ident(),
+            })
+        return False
+
+# Decorator form of stage; rows in and out are taken from the first frame-like argument and the result
+def profiled(name=None):
+    def decorator(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            rows_in = next((row_count(arg) for arg in args if row_count(arg) is not None), None)
+            with stage(stage_name, rows_in) as s:
+                result = func(*args, **kwargs)
+                s.rows_out = row_count(result)
+            return result
+        return wrapper
+    return decorator
+
+# Totals per stage name plus the call counters
+def summary():
+    stages = {}
+    for event in _events:
+        totals = stages.setdefault(event['name'], {'calls': 0, 'wall_ms': 0.0, 'cpu_ms': 0.0, 'rows_in': 0, 'rows_out': 0, 'peak_rss_mb': None})
+        totals['calls'] += 1
+        totals['wall_ms'] += event['wall_ms']
+        totals['cpu_ms'] += event['cpu_ms']
+        totals['rows_in'] += event['rows_in'] or 0
+        totals['rows_out'] += event['rows_out'] or 0
+        totals['peak_rss_mb'] = event['peak_rss_mb']
+    return {'stages': stages, 'counters': dict(_counters)}
+
+# Plain JSON dump of every recorded stage and the summary
+def write_json(path):
+    with open(path, 'w') as f:
+        json.dump({'summary': summary(), 'events': _events}, f, indent=2)
+
+# Trace Event Format file that chrome://tracing, Perfetto and speedscope show as a flame graph
+def write_trace(path):
+    pid = os.getpid()
+    trace_events = [
+        {
+            'name': event['name'],
+            'ph': 'X',
+            'ts': event['start_us'],
+            'dur': event['wall_ms'] * 1000,
+            'pid': pid,
+            'tid': event['thread'],
+            'args': {key: event[key] for key in ('cpu_ms', 'peak_rss_mb', 'rows_in', 'rows_out')},
+        }
+        for event in _events
+    ]
+    for name, value in _counters.items():
+        trace_events.append({'name': name, 'ph': 'C', 'ts': 0, 'pid': pid, 'args': {'calls': value}})
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': trace_events, 'displayTimeUnit': 'ms'}, f)
+
+# Human-readable table of the summary, slowest stages first
+def format_summary():
+    result = summary()
+    lines = [f"{'stage':<34}{'calls':>6}{'wall ms':>11}{'cpu ms':>11}{'rows in':>10}{'rows out':>10}{'peak MB':>10}"]
+    for name, totals in sorted(result['stages'].items(), key=lambda item: -item[1]['wall_ms']):
+        lines.append(f"{name:<34}{totals['calls']:>6}{totals['wall_ms']:>11.1f}{totals['cpu_ms']:>11.1f}"
+                     f"{totals['rows_in']:>10}{totals['rows_out']:>10}{str(totals['peak_rss_mb']):>10}")
+    for name, value in sorted(result['counters'].items()):
+        lines.append(f"{name:<34}{value:>6}")
+    return '\n'.join(lines)
@@ -0,0 +1,121 @@
+import numpy as np
+import pandas as pd
+
+# Fantasy points tables, in the same format as the dicts in the building-logic scripts
+BATSMAN_POINTS = {'Run': 1, 'bFour': 1, 'bSix': 2, '30Runs': 4,
+                  'Half_century': 8, 'Century': 16, 'Duck': -2, '170sr': 6,
+                  '150sr': 4, '130sr': 2, '70sr': -2, '60sr': -4, '50sr': -6}
+
+BOWLING_POINTS = {'Wicket': 25, 'LBW_Bowled': 8, '3W': 4, '4W': 8,
+                  '5W': 16, 'Maiden': 12, '5rpo': 6, '6rpo': 4, '7rpo': 2, '10rpo': -2,
+                  '11rpo': -4, '12rpo': -6}
+
+FIELDING_POINTS = {'Catch': 8, '3Cath': 4, 'Stumping': 12, 'RunOutD': 12,
+                   'RunOutInd': 6}
+
+# Stat column each per-unit entry of the tables multiplies; columns follow match_transform.innings_stats,
+# and columns a table does not have (e.g. lbw_bowled, maidens and dismissed in transformed_match_data.csv) count as zero
+PER_UNIT_KEYS = {'Run': 'run_scored', 'bFour': '4s', 'bSix': '6s', 'Wicket': 'wicket', 'LBW_Bowled': 'lbw_bowled',
+                 'Maiden': 'maidens', 'Catch': 'catch', 'Stumping': 'stump', 'RunOutD': 'run_out_direct',
+                 'RunOutInd': 'run_out'}
+
+# Milestone bonuses; only the highest milestone reached in an innings is awarded
+MILESTONE_KEYS = {
+    'run_scored': {'30Runs': 30, 'Half_century': 50, 'Century': 100},
+    'wicket': {'3W': 3, '4W': 4, '5W': 5},
+    'catch': {'3Cath': 3},
+}
+
+# Rate bands as [low, high) ranges, applied only once the innings reaches the minimum number of balls
+STRIKE_RATE_BANDS = {'50sr': (-np.inf, 50), '60sr': (50, 60), '70sr': (60, 70),
+                     '130sr': (130, 150), '150sr': (150, 170), '170sr': (170, np.inf)}
+ECONOMY_BANDS = {'5rpo': (-np.inf, 5), '6rpo': (5, 6), '7rpo': (6, 7),
+                 '10rpo': (10, 11), '11rpo': (11, 12), '12rpo': (12, np.inf)}
+RATE_RULES = [
+    # (bands, runs column, balls column, scale, minimum balls)
+    (STRIKE_RATE_BANDS, 'run_scored', 'ball_faced', 100, 10),
+    (ECONOMY_BANDS, 'run_given', 'ball_delivered', 6, 12),
+]
+
+# Compile the points tables into weight vectors and threshold bins that score_table applies to whole columns
+def compile_points_tables(batsman_points=BATSMAN_POINTS, bowling_points=BOWLING_POINTS, fielding_points=FIELDING_POINTS):
+    table = {**batsman_points, **bowling_points, **fielding_points}
+    rules = compile_linear({PER_UNIT_KEYS[key]: points for key, points in table.items() if key in PER_UNIT_KEYS})
+
+    for column, milestones in MILESTONE_KEYS.items():
+        reached = sorted((threshold, table[key]) for key, threshold in milestones.items() if key in table)
+        if reached:
+            thresholds = np.array([threshold for threshold, _ in reached], dtype=float)
+            rules['milestones'].append((column, thresholds, np.array([0] + [points for _, points in reached], dtype=float)))
+
+    for bands, runs_column, balls_column, scale, min_balls in RATE_RULES:
+        bands = {key: band for key, band in bands.items() if key in table}
+        if not bands:
+            continue
+        edges = np.array(sorted({bound for band in bands.values() for bound in band if np.isfinite(bound)}), dtype=float)
+        lower_bounds = np.concatenate([[-np.inf], edges])
+        points = np.zeros(len(lower_bounds))
+        for key, (low, high) in bands.items():
+            points[(lower_bounds >= low) & (lower_bounds < high)] = table[key]
+        rules['rates'].append((runs_column, balls_column, scale, min_balls, edges, points))
+
+    rules['duck'] = table.get('Duck', 0)
+    return rules
+
+# A rule set that is only a weighted sum of columns, applied in the given column order
+def compile_linear(weights):
+    return {'weights': list(weights.items()), 'milestones': [], 'rates': [], 'duck': 0}
+
+RULESETS = {
+    # Full per-innings scoring from the points tables
+    't20': compile_points_tables(),
+    # Career totals against an opponent, as returned by the performance index lookups
+    'history': compile_linear({'total_runs': 1.4, 'total_4s': 1, 'total_6s': 2, 'total_wickets': 25,
+                               'total_50s': 8, 'total_100s': 16}),
+    # Predicted runs and wickets of an upcoming match
+    'impact': compile_linear({'predicted_runs': 1.4, 'predicted_wickets': 25}),
+}
+
+# A column as a float array, or zeros if the table does not have it
+def column_values(table, column, n_rows):
+    if column in table:
+        return np.asarray(table[column], dtype=float)
+    return np.zeros(n_rows)
+
+# Points of every row of a stats table, split by rule; rules is a RULESETS name or a compiled rule set
+def score_components(table, rules='t20'):
+    if isinstance(rules, str):
+        rules = RULESETS[rules]
+    n_rows = len(table)
+    components = {}
+
+    # Summed column by column in table order, so linear rule sets give exactly the scalar arithmetic's result
+    points = np.zeros(n_rows)
+    for column, weight in rules['weights']:
+        points = points + column_values(table, column, n_rows) * weight
+    components['per_unit'] = points
+
+    for column, thresholds, milestone_points in rules['milestones']:
+        components[f'{column}_milestone'] = milestone_points[np.searchsorted(thresholds, column_values(table, column, n_rows), side='right')]
+
+    for runs_column, balls_column, scale, min_balls, edges, band_points in rules['rates']:
+        balls = column_values(table, balls_column, n_rows)
+        qualified = balls >= min_balls
+        rate = np.divide(column_values(table, runs_column, n_rows) * scale, balls, out=np.zeros(n_rows), where=qualified)
+        components[f'{runs_column}_rate'] = np.where(qualified, band_points[np.searchsorted(edges, rate, side='right')], 0)
+
+    if rules['duck']:
+        duck = ((column_values(table, 'run_scored', n_rows) == 0) & (column_values(table, 'ball_faced', n_rows) > 0)
+                & (column_values(table, 'dismissed', n_rows) > 0))
+        components['duck'] = np.where(duck, rules['duck'], 0)
+
+    index = table.index if isinstance(table, pd.DataFrame) else None
+    return pd.DataFrame(components, index=index)
+
+# Total points of every row of a stats table in one vectorized pass
+def score_table(table, rules='t20'):
+    components = score_components(table, rules)
+    total = components['per_unit'].to_numpy()
+    for name in components.columns[1:]:
+        total = total + components[name].to_numpy()
+    return pd.Series(total, index=components.index)
@@ -0,0 +1,167 @@
+import argparse
+import queue
+import threading
+import time
+from flask import Flask, jsonify, request
+from cricket_predictions import DATA_COLUMNS, load_data, load_or_train_models, player_averages, score_fixtures
+from data_store import DATA_STORE_DIR, data_source
+from ingest import history_performance_index
+from prediction_cache import PREDICTION_CACHE_DIR, PredictionCache
+
+# Collects fixtures from concurrent requests and scores them together in one vectorized call
+class MicroBatcher:
+    def __init__(self, score_batch, max_wait=0.005, max_batch=256):
+        self.score_batch = score_batch
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.pending = queue.Queue()
+        self.worker = threading.Thread(target=self._run, daemon=True)
+        self.worker.start()
+
+    # Queue fixtures for the next batch and block until their rows come back
+    def submit(self, fixtures):
+        job = {'fixtures': fixtures, 'done': threading.Event(), 'result': None, 'error': None}
+        self.pending.put(job)
+        job['done'].wait()
+        if job['error'] is not None:
+            raise job['error']
+        return job['result']
+
+    # Wait at most max_wait after the first queued job for others to join its batch; jobs are added to the
+    # caller's list as they arrive, so a failure part way still leaves them to be answered
+    def _collect(self, jobs):
+        jobs.append(self.pending.get())
+        deadline = time.monotonic() + self.max_wait
+        while len(jobs) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                jobs.append(self.pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+
+    # Nothing may escape an iteration: a dead worker would leave every current and future request waiting,
+    # so any error reaches the jobs still unanswered and every job of the batch is always released
+    def _run(self):
+        while True:
+            jobs = []
+            try:
+                self._collect(jobs)
+                self._score(jobs)
+            except Exception as error:
+                for job in jobs:
+                    if job['result'] is None and job['error'] is None:
+                        job['error'] = error
+            finally:
+                for job in jobs:
+                    job['done'].set()
+
+    # Score jobs together; if the batch fails, every job is retried on its own so a bad request only fails itself
+    def _score(self, jobs):
+        # Fixture ids from different requests may clash, so every fixture gets a batch-wide id
+        fixtures, owners = [], []
+        for job in jobs:
+            for position, fixture in enumerate(job['fixtures']):
+                owners.append((job, position))
+                fixtures.append((len(fixtures),) + tuple(fixture[1:]))
+        try:
+            results = self.score_batch(fixtures)
+            # Every submitted fixture gets an entry, in the order it was submitted, even if it produced no rows
+            rows_by_fixture = dict(tuple(results.groupby('fixture_id', sort=False)))
+            answers = {id(job): [None] * len(job['fixtures']) for job in jobs}
+            for batch_id, (job, position) in enumerate(owners):
+                fixture_id = job['fixtures'][position][0]
+                rows = rows_by_fixture.get(batch_id, results.iloc[:0])
+                answers[id(job)][position] = (fixture_id, rows.assign(fixture_id=fixture_id))
+        except Exception as error:
+            if len(jobs) == 1:
+                jobs[0]['error'] = error
+                return
+            for job in jobs:
+                self._score([job])
+            return
+        for job in jobs:
+            job['result'] = answers[id(job)]
+
+# JSON body of one scored fixture: every player's scores plus the top 11 by combined score
+def fixture_response(fixture_id, rows):
+    rows = rows.astype(object).where(rows.notna(), None)
+    return {
+        'fixture_id': fixture_id,
+        'top_11': [row['player'] for row in rows.to_dict('records') if row['rank'] <= 11],
+        'players': rows.drop(columns='fixture_id').to_dict('records'),
+    }
+
+# Turn one request fixture into the (fixture_id, team_a, squad_a, team_b, squad_b) tuple score_fixtures takes,
+# rejecting anything that is not two named teams with non-empty lists of player names
+def parse_fixture(body, default_id):
+    if not isinstance(body, dict):
+        raise ValueError('a fixture must be a JSON object')
+    for team, squad in [('team_a', 'squad_a'), ('team_b', 'squad_b')]:
+        if not isinstance(body.get(team), str) or not body[team]:
+            raise ValueError(f'{team} must be a team name')
+        players = body.get(squad)
+        if not isinstance(players, list) or not players or not all(isinstance(player, str) and player for player in players):
+            raise ValueError(f'{squad} must be a non-empty list of player names')
+    return (body.get('fixture_id', default_id), body['team_a'], list(body['squad_a']), body['team_b'], list(body['squad_b']))
+
+# Build the app with data, indexes and models loaded once, before the first request arrives; filters
+# (league, seasons) serve one competition from its partitions of the data store
+def create_app(transformed_file='transformed_match_data.csv', max_wait=0.005, cache_dir=PREDICTION_CACHE_DIR,
+               store_dir=DATA_STORE_DIR, **filters):
+    data = load_data(transformed_file, DATA_COLUMNS, store_dir=store_dir, **filters)
+    source, scope = data_source(transformed_file, store_dir, **filters)
+    artifacts = load_or_train_models(source, data, scope=scope)
+    performance_index = history_performance_index(data, transformed_file, **filters)
+    averages = player_averages(data)
+    # Only the micro-batcher's worker thread scores, so the cache needs no lock
+    cache = PredictionCache(cache_dir=cache_dir)
+
+    def score_batch(fixtures):
+        return score_fixtures(fixtures, data, artifacts, performance_index, averages, cache)
+
+    batcher = MicroBatcher(score_batch, max_wait=max_wait)
+    app = Flask(__name__)
+
+    @app.route('/health')
+    def health():
+        return jsonify({'status': 'ok', 'model': artifacts['key'], 'players': len(averages), 'prediction_cache': cache.stats()})
+
+    @app.route('/predict', methods=['POST'])
+    def predict():
+        try:
+            fixture = parse_fixture(request.get_json(force=True), 1)
+        except ValueError as error:
+            return jsonify({'error': f'invalid fixture: {error}'}), 400
+        (fixture_id, rows), = batcher.submit([fixture])
+        return jsonify(fixture_response(fixture_id, rows))
+
+    @app.route('/predict/batch', methods=['POST'])
+    def predict_batch():
+        try:
+            body = request.get_json(force=True)
+            if not isinstance(body, dict) or not isinstance(body.get('fixtures'), list) or not body['fixtures']:
+                raise ValueError('the body must be a JSON object with a non-empty fixtures list')
+            fixtures = [parse_fixture(fixture, i + 1) for i, fixture in enumerate(body['fixtures'])]
+        except ValueError as error:
+            return jsonify({'error': f'invalid fixtures: {error}'}), 400
+        results = batcher.submit(fixtures)
+        return jsonify({'fixtures': [fixture_response(fixture_id, rows) for fixture_id, rows in results]})
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve fantasy XI predictions over HTTP')
+    parser.add_argument('--data', default='transformed_match_data.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--league', help='serve only this league, read from the partitioned data store')
+    parser.add_argument('--seasons', type=int, nargs='+', help='seasons of history to load from the data store')
+    parser.add_argument('--store-dir', default=DATA_STORE_DIR)
+    parser.add_argument('--max-wait-ms', type=float, default=5.0, help='how long a request may wait for others to batch with')
+    args = parser.parse_args()
+
+    app = create_app(args.data, max_wait=args.max_wait_ms / 1000, store_dir=args.store_dir, league=args.league, seasons=args.seasons)
+    app.run(host=args.host, port=args.port, threaded=True)
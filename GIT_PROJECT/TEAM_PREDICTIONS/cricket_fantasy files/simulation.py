@@ -0,0 +1,140 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from data_cache import read_cached
+from matchup_store import build_matchup_store, matchup_block
+from profiling import profiled
+from scoring import score_table
+
+# Per-innings columns that are resampled; any the history does not have are simulated as zero
+SIMULATION_COLUMNS = ['ball_faced', 'run_scored', '4s', '6s', 'dismissed', 'ball_delivered', 'run_given', 'wicket',
+                      'lbw_bowled', 'maidens', 'catch', 'stump', 'run_out']
+BATTING_COLUMNS = ['run_scored', '4s', '6s']
+BOWLING_COLUMNS = ['wicket']
+
+N_SIMULATIONS = 5000
+# Simulations are always split into this many seeded chunks, so results depend only on the seed, not on n_jobs
+SIMULATION_CHUNKS = 8
+# Balls of overall form a head-to-head record is shrunk towards before it adjusts a player's draws
+MATCHUP_PRIOR_BALLS = 60
+SUMMARY_QUANTILES = [0.05, 0.25, 0.5, 0.75, 0.95]
+
+# Every innings of the given players as contiguous arrays, with each player's start offset and innings count
+def innings_pool(history, players):
+    innings = history[history['player'].isin(players)]
+    order = np.argsort(pd.Index(players).get_indexer(innings['player']), kind='stable')
+    innings = innings.iloc[order]
+    counts = innings['player'].value_counts().reindex(players, fill_value=0).to_numpy()
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    columns = {column: innings[column].to_numpy(dtype=float) for column in SIMULATION_COLUMNS if column in innings}
+    return {'columns': columns, 'starts': starts, 'counts': counts}
+
+# Ratio of a rate against this opponent to the player's overall rate, shrunk towards 1 for short records
+def shrunk_ratio(events_vs, balls_vs, overall_rate):
+    adjusted = (events_vs + MATCHUP_PRIOR_BALLS * overall_rate) / (balls_vs + MATCHUP_PRIOR_BALLS)
+    return np.divide(adjusted, overall_rate, out=np.ones(len(overall_rate)), where=overall_rate > 0)
+
+# Per-player multipliers for batting stats (runs per ball against the opposing bowlers) and for
+# wickets (dismissals per ball against the opposing batsmen), from the batsman-vs-bowler matrices
+def matchup_factors(store, squad, opponents):
+    player_ids = store['players'].get_indexer(squad)
+    known = player_ids >= 0
+    matrices = store['matrices']
+
+    def overall(stat, axis):
+        totals = np.zeros(len(squad))
+        totals[known] = np.asarray(matrices[stat].sum(axis=axis)).ravel()[player_ids[known]]
+        return totals
+
+    batting = matchup_block(store, squad, opponents)
+    bowling = matchup_block(store, opponents, squad)
+    batting_rate = np.divide(overall('runs', 1), overall('balls', 1), out=np.zeros(len(squad)), where=overall('balls', 1) > 0)
+    bowling_rate = np.divide(overall('dismissals', 0), overall('balls', 0), out=np.zeros(len(squad)), where=overall('balls', 0) > 0)
+    return (shrunk_ratio(batting['runs'].sum(axis=1), batting['balls'].sum(axis=1), batting_rate),
+            shrunk_ratio(bowling['dismissals'].sum(axis=0), bowling['balls'].sum(axis=0), bowling_rate))
+
+# Fantasy points of n_sims simulated matches for every player, as an (n_sims, n_players) array:
+# each player's innings is drawn from their own history and scaled by their matchup factors
+def simulate_chunk(pool, batting_factor, bowling_factor, n_sims, seed_sequence, rules='t20'):
+    rng = np.random.default_rng(seed_sequence)
+    counts = pool['counts']
+    draws = pool['starts'] + np.floor(rng.random((n_sims, len(counts))) * np.maximum(counts, 1)).astype(np.int64)
+    # Players without history point past the end of the pool; their draws are discarded below
+    draws = np.minimum(draws, max(counts.sum() - 1, 0))
+    has_history = counts > 0
+
+    simulated = {}
+    for column, values in pool['columns'].items():
+        sampled = values[draws] if len(values) else np.zeros(draws.shape)
+        if column in BATTING_COLUMNS:
+            sampled = sampled * batting_factor
+        elif column in BOWLING_COLUMNS:
+            sampled = sampled * bowling_factor
+        simulated[column] = np.where(has_history, sampled, 0).ravel()
+    points = score_table(pd.DataFrame(simulated), rules).to_numpy()
+    return points.reshape(n_sims, len(counts))
+
+# Mean, spread and quantiles of each player's simulated points, plus how often they make the top 11
+# of the fixture and how often they are its top scorer (the captaincy upside)
+def summarize_simulations(players, teams, points, top_n=11):
+    finishing = np.argsort(np.argsort(-points, axis=1, kind='stable'), axis=1)
+    summary = pd.DataFrame({
+        'player': players,
+        'team': teams,
+        'mean_points': points.mean(axis=0),
+        'std_points': points.std(axis=0),
+    })
+    for q, values in zip(SUMMARY_QUANTILES, np.quantile(points, SUMMARY_QUANTILES, axis=0)):
+        summary[f'q{int(q * 100):02d}'] = values
+    summary[f'p_top{top_n}'] = (finishing < top_n).mean(axis=0)
+    summary['p_top_scorer'] = (finishing == 0).mean(axis=0)
+    return summary.sort_values('mean_points', ascending=False, kind='stable').reset_index(drop=True)
+
+# Simulate one fixture n_sims times across a worker pool and summarize each player's points distribution
+@profiled()
+def simulate_fixture(history, team_a, squad_a, team_b, squad_b, matchup_store=None,
+                     n_sims=N_SIMULATIONS, seed=42, n_jobs=-1, rules='t20'):
+    players = list(squad_a) + list(squad_b)
+    teams = [team_a] * len(squad_a) + [team_b] * len(squad_b)
+    pool = innings_pool(history, players)
+
+    if matchup_store is not None:
+        batting_a, bowling_a = matchup_factors(matchup_store, squad_a, squad_b)
+        batting_b, bowling_b = matchup_factors(matchup_store, squad_b, squad_a)
+        batting_factor = np.concatenate([batting_a, batting_b])
+        bowling_factor = np.concatenate([bowling_a, bowling_b])
+    else:
+        batting_factor = bowling_factor = np.ones(len(players))
+
+    chunk_sizes = [len(chunk) for chunk in np.array_split(np.arange(n_sims), SIMULATION_CHUNKS) if len(chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    chunks = Parallel(n_jobs=n_jobs)(
+        delayed(simulate_chunk)(pool, batting_factor, bowling_factor, size, chunk_seed, rules)
+        for size, chunk_seed in zip(chunk_sizes, seeds)
+    )
+    return summarize_simulations(players, teams, np.vstack(chunks))
+
+
+if __name__ == '__main__':
+    from slate import load_fixtures
+
+    parser = argparse.ArgumentParser(description='Simulate fantasy point distributions for a slate of fixtures')
+    parser.add_argument('fixtures', help='CSV of fixtures (team_a, squad_a, team_b, squad_b)')
+    parser.add_argument('--data', default='transformed_match_data.csv')
+    parser.add_argument('--byb', default='IPl Ball-by-Ball 2008-2023.csv', help='ball-by-ball file for matchup adjustments')
+    parser.add_argument('--sims', type=int, default=N_SIMULATIONS)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--output', default='simulations.csv')
+    args = parser.parse_args()
+
+    history = read_cached(args.data)
+    store = build_matchup_store(read_cached(args.byb)) if os.path.exists(args.byb) else None
+    summaries = []
+    for fixture_id, team_a, squad_a, team_b, squad_b in load_fixtures(args.fixtures):
+        summary = simulate_fixture(history, team_a, squad_a, team_b, squad_b, store, args.sims, args.seed, args.n_jobs)
+        summaries.append(summary.assign(fixture_id=fixture_id))
+    pd.concat(summaries, ignore_index=True).to_csv(args.output, index=False)
+    print(f"Simulated {len(summaries)} fixtures x {args.sims} matches, results written to {args.output}")
@@ -0,0 +1,38 @@
+import pandas as pd
+from cricket_predictions import DATA_COLUMNS, MODEL_BACKEND, load_data, load_or_train_models, player_averages, score_fixtures
+from data_store import DATA_STORE_DIR, data_source
+from ingest import history_performance_index
+from prediction_cache import PREDICTION_CACHE_DIR, PredictionCache
+
+SQUAD_SEPARATOR = ';'
+
+# Read a fixtures CSV with team_a, squad_a, team_b and squad_b columns; squads list players separated by ';'
+def load_fixtures(fixtures_file):
+    fixtures = pd.read_csv(fixtures_file)
+    if 'fixture_id' not in fixtures.columns:
+        fixtures['fixture_id'] = range(1, len(fixtures) + 1)
+
+    return [
+        (
+            row.fixture_id,
+            row.team_a,
+            [player_name.strip() for player_name in row.squad_a.split(SQUAD_SEPARATOR)],
+            row.team_b,
+            [player_name.strip() for player_name in row.squad_b.split(SQUAD_SEPARATOR)],
+        )
+        for row in fixtures.itertuples(index=False)
+    ]
+
+# Score every fixture of a slate with one data load, one model load and one batched scoring pass; filters
+# (league, seasons) restrict the history to those partitions of the data store
+def run_slate(fixtures_file, output_file, transformed_file='transformed_match_data.csv', backend=MODEL_BACKEND, flatten=False,
+              cache_dir=PREDICTION_CACHE_DIR, store_dir=DATA_STORE_DIR, **filters):
+    fixtures = load_fixtures(fixtures_file)
+    data = load_data(transformed_file, DATA_COLUMNS, store_dir=store_dir, **filters)
+    source, scope = data_source(transformed_file, store_dir, **filters)
+    artifacts = load_or_train_models(source, data, backend=backend, flatten=flatten, scope=scope)
+
+    performance_index = history_performance_index(data, transformed_file, **filters)
+    results = score_fixtures(fixtures, data, artifacts, performance_index, player_averages(data), PredictionCache(cache_dir=cache_dir))
+    results.to_csv(output_file, index=False)
+    return results
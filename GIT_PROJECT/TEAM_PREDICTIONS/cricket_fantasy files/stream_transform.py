@@ -0,0 +1,131 @@
+import argparse
+import csv
+import os
+import shutil
+import tempfile
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+from match_transform import TRANSFORMED_COLUMNS, transform_matches
+
+# Ball-by-ball columns the per-innings transform reads; everything else in the source is skipped
+BYB_COLUMNS = ['id', 'inning', 'over', 'batsman', 'bowler', 'batsman_runs', 'extra_runs', 'is_wicket',
+               'dismissal_kind', 'player_dismissed', 'fielder', 'extras_type', 'batting_team', 'bowling_team']
+CHUNK_ROWS = 200000
+
+# Reads one byte range of a file, so pandas can stream a partition without seeing the rest
+class ByteRange:
+    def __init__(self, path, start, end):
+        self.file = open(path, 'rb')
+        self.file.seek(start)
+        self.remaining = end - start
+
+    def read(self, size=-1):
+        if size is None or size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+# Header of a CSV file and the byte offset where its data starts
+def read_header(path):
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        return next(csv.reader([header_line.decode()])), f.tell()
+
+# Split the data rows of the file into n byte ranges that start on a new match, so no match is cut in two;
+# the ball-by-ball file keeps every match's rows together, which the boundary scan relies on
+def match_partitions(path, n_partitions):
+    header, data_start = read_header(path)
+    id_position = header.index('id')
+    size = os.path.getsize(path)
+    boundaries = [data_start]
+    with open(path, 'rb') as f:
+        for k in range(1, n_partitions):
+            offset = max(data_start + (size - data_start) * k // n_partitions, boundaries[-1])
+            f.seek(offset)
+            if offset > data_start:
+                f.readline()
+            line_start = f.tell()
+            line = f.readline()
+            first_id = next(csv.reader([line.decode()]))[id_position] if line else None
+            # Walk forward to the first line of the next match
+            while line:
+                line_start = f.tell()
+                line = f.readline()
+                if not line or next(csv.reader([line.decode()]))[id_position] != first_id:
+                    break
+            boundaries.append(min(line_start, size))
+    boundaries.append(size)
+    return header, [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+# Transform one byte range chunk by chunk into output_file; the rows of the last match of each chunk are
+# carried into the next one, so memory holds one chunk plus one match however large the range is
+def transform_range(path, header, start, end, output_file, chunk_rows=CHUNK_ROWS):
+    source = ByteRange(path, start, end)
+    carry = None
+    finished = set()
+    written = 0
+    with open(output_file, 'w', newline='') as out:
+        try:
+            for chunk in pd.read_csv(source, names=header, header=None, usecols=BYB_COLUMNS, chunksize=chunk_rows):
+                if carry is not None:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                last_id = chunk['id'].iloc[-1]
+                complete = chunk[chunk['id'] != last_id]
+                carry = chunk[chunk['id'] == last_id]
+                if complete['id'].isin(finished).any():
+                    raise ValueError(f"{path} is not grouped by match id; sort it by id before streaming")
+                finished.update(complete['id'].unique())
+                written += write_innings(complete, out)
+        finally:
+            source.close()
+        if carry is not None:
+            written += write_innings(carry, out)
+    return written
+
+def write_innings(byb, out):
+    if byb.empty:
+        return 0
+    innings = transform_matches(byb)
+    innings.to_csv(out, header=False, index=False)
+    return len(innings)
+
+# Rebuild transformed_match_data.csv from the ball-by-ball file in bounded memory, optionally
+# transforming n_jobs partitions of the file in parallel and joining the parts in file order
+def stream_transform(byb_file, output_file, chunk_rows=CHUNK_ROWS, n_jobs=1):
+    header, partitions = match_partitions(byb_file, effective_n_jobs(n_jobs))
+    missing = [column for column in BYB_COLUMNS if column not in header]
+    if missing:
+        raise ValueError(f"{byb_file} is missing ball-by-ball columns: {', '.join(missing)}")
+
+    part_dir = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(output_file)))
+    try:
+        part_files = [os.path.join(part_dir, f'part_{k}.csv') for k in range(len(partitions))]
+        counts = Parallel(n_jobs=n_jobs)(
+            delayed(transform_range)(byb_file, header, start, end, part_file, chunk_rows)
+            for (start, end), part_file in zip(partitions, part_files)
+        )
+        with open(output_file + '.tmp', 'w', newline='') as out:
+            out.write(','.join(TRANSFORMED_COLUMNS) + '\n')
+            for part_file in part_files:
+                with open(part_file, newline='') as part:
+                    shutil.copyfileobj(part, out)
+        os.replace(output_file + '.tmp', output_file)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    return sum(counts)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build transformed_match_data.csv from the ball-by-ball file in chunks')
+    parser.add_argument('--byb', default='IPl Ball-by-Ball 2008-2023.csv')
+    parser.add_argument('--output', default='transformed_match_data.csv')
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS, help='ball-by-ball rows held in memory per worker')
+    parser.add_argument('--n-jobs', type=int, default=1, help='file partitions transformed in parallel')
+    args = parser.parse_args()
+
+    rows = stream_transform(args.byb, args.output, args.chunk_rows, args.n_jobs)
+    print(f"Wrote {rows} player innings to {args.output}")
@@ -0,0 +1,139 @@
+import argparse
+import os
+import numpy as np
+import pandas as pd
+from match_transform import transform_matches
+
+# One unit of scale is roughly the real IPL 2008-2023 volume: 16 seasons of ~64 matches between 10 teams
+SEASONS = 16
+MATCHES_PER_SEASON = 64
+TEAMS_PER_LEAGUE = 10
+SQUAD_SIZE = 15
+BALLS_PER_INNINGS = 120
+
+RUN_VALUES = np.array([0, 1, 2, 3, 4, 6])
+RUN_PROBABILITIES = np.array([0.38, 0.36, 0.08, 0.01, 0.12, 0.05])
+WICKET_PROBABILITY = 0.045
+WIDE_PROBABILITY = 0.03
+DISMISSAL_KINDS = np.array(['caught', 'bowled', 'lbw', 'run out', 'stumped'])
+DISMISSAL_PROBABILITIES = np.array([0.62, 0.18, 0.1, 0.07, 0.03])
+
+# Number of leagues and matches for a scale factor; fractional scales shrink the season length
+def league_shape(scale):
+    leagues = max(1, int(scale))
+    matches_per_season = max(1, int(round(MATCHES_PER_SEASON * scale / leagues)))
+    return leagues, matches_per_season
+
+# Fixtures of every league and season, with dates in date order
+def generate_matches(rng, scale):
+    leagues, matches_per_season = league_shape(scale)
+    n_matches = leagues * SEASONS * matches_per_season
+    league = np.repeat(np.arange(leagues), SEASONS * matches_per_season)
+    season = np.tile(np.repeat(np.arange(SEASONS), matches_per_season), leagues)
+    day = np.tile(np.tile(np.arange(matches_per_season), SEASONS), leagues)
+
+    team1 = rng.integers(0, TEAMS_PER_LEAGUE, n_matches)
+    team2 = (team1 + rng.integers(1, TEAMS_PER_LEAGUE, n_matches)) % TEAMS_PER_LEAGUE
+    dates = pd.to_datetime((2008 + season).astype(str) + '-04-01') + pd.to_timedelta(day * 60 // matches_per_season, unit='D')
+    return pd.DataFrame({
+        'id': np.arange(1, n_matches + 1),
+        'league': [f'League {l}' for l in league],
+        'season': 2008 + season,
+        'date': dates.strftime('%Y-%m-%d'),
+        'team1': [f'L{l} Team {t}' for l, t in zip(league, team1)],
+        'team2': [f'L{l} Team {t}' for l, t in zip(league, team2)],
+        'venue': [f'L{l} Ground {t}' for l, t in zip(league, team1)],
+        'winner': [f'L{l} Team {t}' for l, t in zip(league, np.where(rng.random(n_matches) < 0.5, team1, team2))],
+    })
+
+# Ball-by-ball rows for every innings of the given fixtures, generated as whole arrays
+def generate_ball_by_ball(rng, matches):
+    n_innings = 2 * len(matches)
+    match_ids = np.repeat(matches['id'].to_numpy(), 2)
+    first = np.column_stack([matches['team1'], matches['team2']]).ravel()
+    second = np.column_stack([matches['team2'], matches['team1']]).ravel()
+
+    # Each innings draws a random batting order and fielding XI from the squads; five of the fielders bowl
+    batting_order = np.argsort(rng.random((n_innings, SQUAD_SIZE)), axis=1)[:, :11]
+    fielding_xi = np.argsort(rng.random((n_innings, SQUAD_SIZE)), axis=1)[:, :11]
+    shape = (n_innings, BALLS_PER_INNINGS)
+
+    runs = rng.choice(RUN_VALUES, size=shape, p=RUN_PROBABILITIES)
+    wides = rng.random(shape) < WIDE_PROBABILITY
+    wickets = (rng.random(shape) < WICKET_PROBABILITY) & ~wides
+    runs[wides | wickets] = 0
+    wickets_before = np.cumsum(wickets, axis=1) - wickets
+    in_play = wickets_before < 10
+
+    rows = np.repeat(np.arange(n_innings), BALLS_PER_INNINGS).reshape(shape)
+    ball_number = np.tile(np.arange(BALLS_PER_INNINGS), (n_innings, 1))
+    striker = batting_order[rows, np.minimum(wickets_before, 10)]
+    non_striker = batting_order[rows, np.minimum(wickets_before + 1, 10)]
+    bowler = fielding_xi[rows, 6 + (ball_number // 6) % 5]
+    fielder = fielding_xi[rows, rng.integers(0, 11, shape)]
+    dismissal = rng.choice(len(DISMISSAL_KINDS), size=shape, p=DISMISSAL_PROBABILITIES)
+
+    keep = in_play.ravel()
+
+    def kept(values):
+        return values.ravel()[keep]
+
+    batting_team = np.repeat(first, BALLS_PER_INNINGS)[keep]
+    bowling_team = np.repeat(second, BALLS_PER_INNINGS)[keep]
+    is_wicket = kept(wickets)
+    kind = np.where(is_wicket, DISMISSAL_KINDS[kept(dismissal)], None)
+    has_fielder = np.isin(kind, ['caught', 'run out', 'stumped'])
+    batsman_names = squad_names(batting_team, kept(striker))
+    extras = kept(wides).astype(int)
+
+    return pd.DataFrame({
+        'id': np.repeat(match_ids, BALLS_PER_INNINGS)[keep],
+        'inning': np.tile(np.repeat([1, 2], BALLS_PER_INNINGS), len(matches))[keep],
+        'over': kept(ball_number // 6),
+        'ball': kept(ball_number % 6 + 1),
+        'batsman': batsman_names,
+        'non_striker': squad_names(batting_team, kept(non_striker)),
+        'bowler': squad_names(bowling_team, kept(bowler)),
+        'batsman_runs': kept(runs),
+        'extra_runs': extras,
+        'total_runs': kept(runs) + extras,
+        'non_boundary': 0,
+        'is_wicket': is_wicket.astype(int),
+        'dismissal_kind': kind,
+        'player_dismissed': np.where(is_wicket, np.asarray(batsman_names), None),
+        'fielder': np.where(has_fielder, np.asarray(squad_names(bowling_team, kept(fielder))), None),
+        'extras_type': np.where(extras == 1, 'wides', None),
+        'batting_team': batting_team,
+        'bowling_team': bowling_team,
+    })
+
+# Player names come from the team and squad slot, so they are stable across matches;
+# they are built once per squad and gathered by code rather than formatted per ball
+def squad_names(teams, slots):
+    team_codes, team_names = pd.factorize(teams)
+    names = [f"{team.replace(' Team ', 'T')} Player {slot}" for team in team_names for slot in range(SQUAD_SIZE)]
+    return pd.Categorical.from_codes(team_codes * SQUAD_SIZE + slots, categories=names)
+
+# Generate a seeded league with the same schemas as the IPL source files and write them to out_dir
+def generate_league(out_dir, scale=1.0, seed=42):
+    rng = np.random.default_rng(seed)
+    matches = generate_matches(rng, scale)
+    byb = generate_ball_by_ball(rng, matches)
+    transformed = transform_matches(byb)
+
+    os.makedirs(out_dir, exist_ok=True)
+    matches.to_csv(os.path.join(out_dir, 'IPL Mathces 2008-2023.csv'), index=False)
+    byb.to_csv(os.path.join(out_dir, 'IPl Ball-by-Ball 2008-2023.csv'), index=False)
+    transformed.to_csv(os.path.join(out_dir, 'transformed_match_data.csv'), index=False)
+    return {'matches': len(matches), 'balls': len(byb), 'player_innings': len(transformed)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate a seeded synthetic league in the IPL file formats')
+    parser.add_argument('out_dir')
+    parser.add_argument('--scale', type=float, default=1.0, help='multiple of the real IPL 2008-2023 volume')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    sizes = generate_league(args.out_dir, args.scale, args.seed)
+    print(f"Wrote {sizes['matches']} matches, {sizes['balls']} balls, {sizes['player_innings']} player innings to {args.out_dir}")
@@ -0,0 +1,120 @@
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from cricket_predictions import DATA_COLUMNS, TRAINING_PARAMS, encoded_columns, load_data, load_or_train_models, preprocess_data, train_models
+from evaluation import TEST_SIZE, evaluate_models, holdout_mask
+from model_store import MODEL_STORE_DIR, file_fingerprint, save_tuned_params
+from scoring import RULESETS
+
+# Values tried for each training parameter; every combination is one candidate configuration
+SEARCH_SPACE = {
+    'n_clusters': [3, 5, 8, 12],
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 8, 16],
+    'min_samples_leaf': [1, 5],
+}
+# Each rung keeps the best 1/ETA of its configurations and gives them ETA times the training matches
+ETA = 3
+MIN_FRACTION = 1 / 27
+# Columns a trial needs; they are extracted once and shared by every trial
+FEATURE_COLUMNS = ['match_id', 'ball_faced', 'ball_delivered', 'run_given', 'run_scored', 'wicket']
+
+# Every configuration of the search space, on top of the fixed training parameters
+def candidate_configs(space=SEARCH_SPACE, base=TRAINING_PARAMS):
+    names = list(space)
+    return [{**base, **dict(zip(names, values))} for values in itertools.product(*(space[name] for name in names))]
+
+# Read and encode the data once; trials slice these arrays instead of re-reading or re-encoding anything.
+# Trials use the sparse opponent encoding, which gives the same models as the dense one at a fraction of the memory.
+def shared_features(data):
+    _, encoder, against_team_encoded = preprocess_data(data, 'sparse')
+    shared = {column: data[column].to_numpy() for column in FEATURE_COLUMNS}
+    shared.update({'encoder': encoder, 'encoded': against_team_encoded})
+    return shared
+
+def feature_rows(shared, rows):
+    return pd.DataFrame({column: shared[column][rows] for column in FEATURE_COLUMNS}), shared['encoded'][rows]
+
+# Held-out error in impact-score points: runs and wickets MAE weighted as the impact ruleset weighs them
+def objective(report):
+    weights = dict(RULESETS['impact']['weights'])
+    return weights['predicted_runs'] * report['runs'].loc['all', 'mae'] + weights['predicted_wickets'] * report['wickets'].loc['all', 'mae']
+
+# Fit one configuration on some training rows and score it on the held-out rows
+def run_trial(shared, train_rows, test_rows, params):
+    train, train_encoded = feature_rows(shared, train_rows)
+    test, test_encoded = feature_rows(shared, test_rows)
+    models_runs, models_wickets, kmeans_runs, kmeans_wickets = train_models(train, train_encoded, n_jobs=1, encoder=shared['encoder'], **params)
+    opponent_columns = encoded_columns(train_encoded, shared['encoder'])
+    artifacts = {
+        'models_runs': models_runs, 'models_wickets': models_wickets, 'kmeans_runs': kmeans_runs, 'kmeans_wickets': kmeans_wickets,
+        'encoder': shared['encoder'], 'encoding': 'sparse',
+        'features_runs': ['ball_faced'] + opponent_columns, 'features_wickets': ['ball_delivered', 'run_given'] + opponent_columns,
+    }
+    report = evaluate_models(artifacts, test, n_jobs=1, against_team_encoded=test_encoded)
+    return {
+        'objective': objective(report),
+        'runs_mae': report['runs'].loc['all', 'mae'],
+        'wickets_mae': report['wickets'].loc['all', 'mae'],
+        'wickets_accuracy': report['wickets'].loc['all', 'accuracy'],
+    }
+
+# Successive halving: every configuration is fitted on a small share of the training matches, and only the
+# best 1/eta of each rung moves on to eta times as many matches, until the survivors train on all of them.
+# Rungs use nested match subsets and every trial is scored on the same held-out matches.
+def successive_halving(shared, train_matches, test_rows, configs, eta=ETA, min_fraction=MIN_FRACTION, n_jobs=-1):
+    trials = []
+    survivors = configs
+    fraction = min_fraction
+    while True:
+        matches = train_matches[:max(1, int(round(len(train_matches) * fraction)))]
+        train_rows = np.flatnonzero(np.isin(shared['match_id'], matches))
+        scores = Parallel(n_jobs=n_jobs)(delayed(run_trial)(shared, train_rows, test_rows, params) for params in survivors)
+        for params, score in zip(survivors, scores):
+            trials.append({**params, 'fraction': fraction, 'train_rows': len(train_rows), **score})
+        ranked = [survivors[i] for i in np.argsort([score['objective'] for score in scores], kind='stable')]
+        if fraction >= 1 or len(survivors) == 1:
+            return ranked[0], pd.DataFrame(trials)
+        survivors = ranked[:max(1, len(survivors) // eta)]
+        fraction = min(1.0, fraction * eta)
+
+# Forest fitting work of a set of trials relative to fitting every configuration on all the data
+def compute_share(trials, configs):
+    used = (trials['fraction'] * trials['n_estimators']).sum()
+    return used / sum(params['n_estimators'] for params in configs)
+
+# Search the space, then train the winner on all the data straight into the model store and record it
+# as the store's tuned parameters, so later training and loading pick it up without a retrain
+def tune(transformed_file, space=SEARCH_SPACE, store_dir=MODEL_STORE_DIR, test_size=TEST_SIZE, eta=ETA, min_fraction=MIN_FRACTION,
+         n_jobs=-1, seed=42):
+    data = load_data(transformed_file, DATA_COLUMNS)
+    shared = shared_features(data)
+    test = holdout_mask(data, test_size, seed)
+    train_matches = np.unique(shared['match_id'][~test])
+    np.random.default_rng(seed).shuffle(train_matches)
+
+    configs = candidate_configs(space)
+    best, trials = successive_halving(shared, train_matches, np.flatnonzero(test), configs, eta, min_fraction, n_jobs)
+    artifacts = load_or_train_models(transformed_file, data, best, store_dir)
+    save_tuned_params(best, store_dir, model_key=artifacts['key'], data=file_fingerprint(transformed_file),
+                      objective=float(trials.loc[trials['fraction'] >= 1, 'objective'].min()) if (trials['fraction'] >= 1).any() else None)
+    return best, trials, compute_share(trials, configs)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Tune the cluster model parameters with successive halving')
+    parser.add_argument('--data', default='transformed_match_data.csv')
+    parser.add_argument('--store-dir', default=MODEL_STORE_DIR)
+    parser.add_argument('--eta', type=int, default=ETA)
+    parser.add_argument('--min-fraction', type=float, default=MIN_FRACTION, help='share of training matches in the first rung')
+    parser.add_argument('--n-jobs', type=int, default=-1, help='trials fitted in parallel')
+    parser.add_argument('--output', default='tuning_trials.csv')
+    args = parser.parse_args()
+
+    best, trials, share = tune(args.data, store_dir=args.store_dir, eta=args.eta, min_fraction=args.min_fraction, n_jobs=args.n_jobs)
+    trials.to_csv(args.output, index=False)
+    print(trials.groupby('fraction')['objective'].agg(['size', 'min', 'median']).round(3).to_string())
+    print(f"Best parameters: {best}")
+    print(f"{len(trials)} trials using {share:.0%} of the forest fitting of a full grid; trials written to {args.output}")